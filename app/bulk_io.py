@@ -0,0 +1,99 @@
+"""
+Lectura y escritura incremental de archivos CSV y NDJSON para la importación
+y exportación masiva. Los lectores recorren el archivo registro a registro y
+los escritores serializan bloque a bloque, sin cargar todo en memoria.
+"""
+import codecs
+import csv
+import io
+import json
+from typing import BinaryIO, Iterable, Iterator, Optional, Sequence, Tuple
+
+from . import schemas
+
+# Extensiones y tipos de contenido reconocidos para cada formato
+_FORMAT_HINTS = {
+    schemas.BulkFormat.CSV: (".csv", "text/csv"),
+    schemas.BulkFormat.NDJSON: (".ndjson", ".jsonl", "application/x-ndjson", "application/jsonl"),
+}
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[schemas.BulkFormat]:
+    """Deduce el formato a partir del nombre del archivo o del tipo de contenido"""
+    name = (filename or "").lower()
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    for fmt, hints in _FORMAT_HINTS.items():
+        if any(name.endswith(hint) or ctype == hint for hint in hints):
+            return fmt
+    return None
+
+def _text_lines(stream: BinaryIO) -> Iterator[str]:
+    """Decodifica el flujo binario línea a línea (UTF-8, admite BOM)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in iter(lambda: stream.read(64 * 1024), b""):
+        pending += decoder.decode(chunk)
+        # La última parte puede estar incompleta hasta el siguiente bloque
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+def iter_csv_records(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    """
+    Genera (número de registro, dict) por cada fila de datos del CSV.
+    La primera fila debe contener los nombres de las columnas.
+    """
+    reader = csv.DictReader(_text_lines(stream))
+    for number, record in enumerate(reader, start=1):
+        # Las columnas vacías se tratan como ausentes
+        yield number, {key: value for key, value in record.items() if key and value not in (None, "")}
+
+def iter_ndjson_records(stream: BinaryIO) -> Iterator[Tuple[int, object]]:
+    """
+    Genera (número de línea, objeto) por cada línea de un archivo NDJSON.
+    Las líneas con JSON inválido se entregan como ValueError para reportarlas.
+    """
+    for number, line in enumerate(_text_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, ValueError(f"Invalid JSON: {exc}")
+
+def iter_records(stream: BinaryIO, fmt: schemas.BulkFormat) -> Iterator[Tuple[int, object]]:
+    if fmt == schemas.BulkFormat.CSV:
+        return iter_csv_records(stream)
+    return iter_ndjson_records(stream)
+
+def iter_csv_chunks(columns: Sequence[str], chunks: Iterable[list]) -> Iterator[str]:
+    """Serializa bloques de filas como CSV, emitiendo primero la cabecera"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_ndjson_chunks(columns: Sequence[str], chunks: Iterable[list]) -> Iterator[str]:
+    """Serializa bloques de filas como NDJSON (un objeto por línea)"""
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows
+        )
+
+def iter_export(fmt: schemas.BulkFormat, columns: Sequence[str], chunks: Iterable[list]) -> Iterator[str]:
+    if fmt == schemas.BulkFormat.CSV:
+        return iter_csv_chunks(columns, chunks)
+    return iter_ndjson_chunks(columns, chunks)
+
+EXPORT_MEDIA_TYPES = {
+    schemas.BulkFormat.CSV: "text/csv",
+    schemas.BulkFormat.NDJSON: "application/x-ndjson",
+}
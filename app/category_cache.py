@@ -0,0 +1,106 @@
+"""
+Caché en memoria del proceso para las categorías de riesgo.
+
+Las categorías son pocas y cambian rara vez, así que se mantienen como una
+instantánea inmutable junto con la versión de la colección con la que se
+cargaron (models.CollectionVersion). Las escrituras de crud la actualizan
+directamente (write-through) y, como otros workers de uvicorn también pueden
+escribir, la versión se vuelve a comprobar como máximo cada CHECK_INTERVAL
+segundos con una lectura por clave primaria.
+"""
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Iterable, Mapping, NamedTuple, Optional, Tuple
+
+from . import schemas
+
+CHECK_INTERVAL = float(os.getenv("RISK_CATEGORY_CACHE_TTL", "1.0"))
+
+
+class _Snapshot(NamedTuple):
+    version: Optional[int]
+    categories: Tuple[schemas.RiskCategory, ...]
+    by_id: Mapping[int, schemas.RiskCategory]
+    names: Mapping[int, str]
+
+_EMPTY = _Snapshot(None, (), MappingProxyType({}), MappingProxyType({}))
+
+
+class CategoryCache:
+    def __init__(self, check_interval: float = CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # Los lectores toman la instantánea completa con una sola lectura
+        self._snapshot = _EMPTY
+        self._checked_at = 0.0
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._snapshot.version
+
+    @property
+    def categories(self) -> Tuple[schemas.RiskCategory, ...]:
+        return self._snapshot.categories
+
+    @property
+    def names(self) -> Mapping[int, str]:
+        """Mapa id → nombre de solo lectura, para templates y serializadores"""
+        return self._snapshot.names
+
+    def get(self, category_id: int) -> Optional[schemas.RiskCategory]:
+        return self._snapshot.by_id.get(category_id)
+
+    def needs_check(self) -> bool:
+        return self._snapshot.version is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    def mark_checked(self):
+        self._checked_at = time.monotonic()
+
+    def replace(self, version: int, categories: Iterable[schemas.RiskCategory]):
+        """Reemplaza la instantánea completa"""
+        with self._lock:
+            self._publish(version, categories)
+
+    def upsert(self, version: int, category: schemas.RiskCategory):
+        """Aplica una categoría creada o modificada por este proceso"""
+        with self._lock:
+            if self._follows(version):
+                by_id = dict(self._snapshot.by_id)
+                by_id[category.id] = category
+                self._publish(version, by_id.values())
+
+    def remove(self, version: int, category_id: int):
+        """Aplica una categoría eliminada por este proceso"""
+        with self._lock:
+            if self._follows(version):
+                by_id = dict(self._snapshot.by_id)
+                by_id.pop(category_id, None)
+                self._publish(version, by_id.values())
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = _EMPTY
+
+    def _follows(self, version: int) -> bool:
+        # Si otro worker escribió entre medio, la instantánea no se puede
+        # completar localmente: se descarta para recargarla en el próximo uso
+        current = self._snapshot.version
+        if current is None or version != current + 1:
+            self._snapshot = _EMPTY
+            return False
+        return True
+
+    def _publish(self, version: int, categories: Iterable[schemas.RiskCategory]):
+        ordered = tuple(sorted(categories, key=lambda category: category.id))
+        self._snapshot = _Snapshot(
+            version=version,
+            categories=ordered,
+            by_id=MappingProxyType({category.id: category for category in ordered}),
+            names=MappingProxyType({category.id: category.name for category in ordered}),
+        )
+        self._checked_at = time.monotonic()
+
+
+category_cache = CategoryCache()
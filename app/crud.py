@@ -1,383 +1,1853 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
-
-def calculate_risk_level(probability: int, impact: int) -> schemas.RiskLevel:
-    """
-    Calcula el nivel de riesgo basado en probabilidad e impacto.
-    Formula: Puntuación = Probabilidad × Impacto
-    """
-    score = probability * impact
-    if score <= 4:
-        return schemas.RiskLevel.LOW
-    elif score <= 10:
-        return schemas.RiskLevel.MEDIUM
-    elif score <= 20:
-        return schemas.RiskLevel.HIGH
-    else:
-        return schemas.RiskLevel.CRITICAL
-
-def get_risk_recommendations(risk_level: schemas.RiskLevel, probability: int, impact: int) -> str:
-    """
-    Genera recomendaciones automáticas basadas en el nivel de riesgo,
-    probabilidad e impacto.
-    """
-    score = probability * impact
-    
-    recommendations = {
-        schemas.RiskLevel.LOW: [
-            "Monitoreo periódico del riesgo",
-            "Documentar en registro de riesgos",
-            "Revisar en reuniones trimestrales",
-            "Mantener en observación"
-        ],
-        schemas.RiskLevel.MEDIUM: [
-            "Asignar responsable específico",
-            "Definir plan de acción con fechas límite",
-            "Monitoreo mensual del riesgo",
-            "Establecer indicadores de control (KPIs)",
-            "Reportar en reuniones mensuales de equipo",
-            "Evaluar controles preventivos"
-        ],
-        schemas.RiskLevel.HIGH: [
-            "Plan de mitigación inmediato requerido",
-            "Asignar recursos y presupuesto específicos",
-            "Monitoreo semanal con reportes ejecutivos",
-            "Reporte directo a gerencia y stakeholders",
-            "Definir triggers de escalamiento claro",
-            "Evaluar transferencia del riesgo (seguros)",
-            "Desarrollar plan de contingencia detallado"
-        ],
-        schemas.RiskLevel.CRITICAL: [
-            "¡Acción inmediata requerida!",
-            "Escalar a comité de crisis o directiva",
-            "Asignar presupuesto de emergencia",
-            "Monitoreo diario con reportes ejecutivos",
-            "Plan de contingencia activado inmediatamente",
-            "Comunicación constante con todos los stakeholders",
-            "Considerar evitación completa del riesgo",
-            "Reuniones diarias de seguimiento"
-        ]
-    }
-    
-    # Recomendaciones base según el nivel
-    base_recommendations = recommendations.get(risk_level, [])
-    
-    # Recomendaciones adicionales basadas en características específicas
-    additional_recommendations = []
-    
-    if probability >= 4:
-        additional_recommendations.extend([
-            "Implementar controles preventivos inmediatos",
-            "Aumentar frecuencia de monitoreo",
-            "Capacitar equipo en procedimientos de emergencia"
-        ])
-    
-    if impact >= 4:
-        additional_recommendations.extend([
-            "Desarrollar plan de contingencia detallado",
-            "Identificar recursos alternativos",
-            "Establecer comunicaciones de crisis"
-        ])
-    
-    if score > 15:
-        additional_recommendations.append("Realizar análisis de root cause completo")
-    
-    if probability == 5 and impact == 5:
-        additional_recommendations.extend([
-            "Activación inmediata de protocolo de crisis",
-            "Notificación a autoridades si aplica",
-            "Asignación de equipo dedicado full-time"
-        ])
-    
-    # Combinar todas las recomendaciones
-    all_recommendations = base_recommendations + additional_recommendations
-    
-    return "; ".join(all_recommendations)
-
-def get_detailed_recommendations(risk_level: schemas.RiskLevel, probability: int, impact: int) -> str:
-    """
-    Genera recomendaciones más detalladas y formateadas para respuestas específicas
-    """
-    score = probability * impact
-    
-    urgency_levels = {
-        schemas.RiskLevel.LOW: "BAJA URGENCIA",
-        schemas.RiskLevel.MEDIUM: "URGENCIA MODERADA",
-        schemas.RiskLevel.HIGH: "ALTA URGENCIA",
-        schemas.RiskLevel.CRITICAL: "URGENCIA CRÍTICA"
-    }
-    
-    detailed_recommendations = f"""
-ANÁLISIS DE RIESGO - RECOMENDACIONES ESPECÍFICAS
-=============================================
-
-NIVEL DE RIESGO: {risk_level.value}
-PUNTAJE: {score} (Probabilidad: {probability}/5 × Impacto: {impact}/5)
-NIVEL DE URGENCIA: {urgency_levels.get(risk_level, 'NO DEFINIDO')}
-
-RECOMENDACIONES PRINCIPALES:
-----------------------------
-"""
-    
-    if risk_level == schemas.RiskLevel.LOW:
-        detailed_recommendations += """
-• Monitoreo trimestral mediante checklist
-• Mantener documentación en registro oficial
-• Revisar en reuniones de equipo mensuales
-• Evaluar en revisiones periódicas de proceso
-"""
-    elif risk_level == schemas.RiskLevel.MEDIUM:
-        detailed_recommendations += """
-• Asignar responsable específico con autoridad
-• Desarrollar plan de acción con cronograma de 30 días
-• Monitoreo mensual con reportes formales
-• Establecer KPIs de control específicos
-• Incluir en reportes de gestión mensuales
-"""
-    elif risk_level == schemas.RiskLevel.HIGH:
-        detailed_recommendations += """
-• Plan de mitigación a implementar en máximo 7 días
-• Asignar recursos dedicados y presupuesto
-• Monitoreo semanal con reportes ejecutivos
-• Comunicación directa con alta gerencia
-• Desarrollar plan de contingencia operativo
-• Evaluar opciones de transferencia de riesgo
-"""
-    elif risk_level == schemas.RiskLevel.CRITICAL:
-        detailed_recommendations += """
-• ACCIÓN INMEDIATA REQUERIDA (menos de 48 horas)
-• Activación de comité de crisis
-• Presupuesto de emergencia asignado
-• Monitoreo diario con reportes horarios si es necesario
-• Plan de contingencia activado inmediatamente
-• Comunicación constante con stakeholders clave
-• Considerar parada de operaciones si aplica
-"""
-
-    # Recomendaciones adicionales basadas en score
-    if score > 18:
-        detailed_recommendations += """
-RECOMENDACIONES ADICIONALES POR ALTO PUNTAJE:
----------------------------------------------
-• Reunión urgente con comité directivo
-• Evaluar parar actividades relacionadas temporalmente
-• Notificar a autoridades regulatorias si aplica
-• Activar plan de comunicación de crisis
-"""
-
-    if probability >= 4:
-        detailed_recommendations += """
-CONTROLES PREVENTIVOS RECOMENDADOS:
------------------------------------
-• Implementar controles preventivos inmediatos
-• Aumentar frecuencia de auditorías
-• Capacitación intensiva del personal
-• Redundancia en sistemas críticos
-"""
-
-    detailed_recommendations += f"""
-PRÓXIMOS PASOS SUGERIDOS:
--------------------------
-1. Revisar y priorizar recomendaciones
-2. Asignar responsables y fechas límite
-3. Establecer sistema de monitoreo
-4. Programar seguimiento en { '30 días' if risk_level == schemas.RiskLevel.LOW else '15 días' if risk_level == schemas.RiskLevel.MEDIUM else '7 días' if risk_level == schemas.RiskLevel.HIGH else '24 horas' }
-5. Documentar lecciones aprendidas
-"""
-
-    return detailed_recommendations
-
-
-
-# CRUD operations for Risk
-def create_risk(db: Session, risk: schemas.RiskCreate):
-    risk_level = calculate_risk_level(risk.probability, risk.impact)
-    recommendations = get_risk_recommendations(risk_level, risk.probability, risk.impact)
-    
-    db_risk = models.Risk(
-        **risk.dict(),
-        risk_level=risk_level,
-        status=models.RiskStatus.OPEN,
-        recommendations=recommendations  # ← Guardamos las recomendaciones
-    )
-    db.add(db_risk)
-    db.commit()
-    db.refresh(db_risk)
-    return db_risk
-
-def get_risks(db: Session, skip: int = 0, limit: int = 100, filters: dict = None):
-    """
-    Obtiene todos los riesgos con filtros opcionales
-    """
-    query = db.query(models.Risk)
-    
-    if filters:
-        if filters.get('category_id'):
-            query = query.filter(models.Risk.category_id == filters['category_id'])
-        if filters.get('risk_level'):
-            query = query.filter(models.Risk.risk_level == filters['risk_level'])
-        if filters.get('status'):
-            query = query.filter(models.Risk.status == filters['status'])
-        if filters.get('probability_min'):
-            query = query.filter(models.Risk.probability >= filters['probability_min'])
-        if filters.get('probability_max'):
-            query = query.filter(models.Risk.probability <= filters['probability_max'])
-        if filters.get('owner'):
-            query = query.filter(models.Risk.owner.ilike(f"%{filters['owner']}%"))
-    
-    return query.offset(skip).limit(limit).all()
-
-def get_risk(db: Session, risk_id: int):
-    """
-    Obtiene un riesgo específico por ID
-    """
-    return db.query(models.Risk).filter(models.Risk.id == risk_id).first()
-
-def update_risk(db: Session, risk_id: int, risk_update: schemas.RiskUpdate):
-    db_risk = db.query(models.Risk).filter(models.Risk.id == risk_id).first()
-    if not db_risk:
-        return None
-    
-    update_data = risk_update.dict(exclude_unset=True)
-    
-    # Recalcular si cambia probabilidad o impacto
-    if 'probability' in update_data or 'impact' in update_data:
-        new_prob = update_data.get('probability', db_risk.probability)
-        new_impact = update_data.get('impact', db_risk.impact)
-        new_risk_level = calculate_risk_level(new_prob, new_impact)
-        update_data['risk_level'] = new_risk_level
-        update_data['recommendations'] = get_risk_recommendations(
-            new_risk_level, new_prob, new_impact
-        )
-    
-    for field, value in update_data.items():
-        setattr(db_risk, field, value)
-    
-    db.commit()
-    db.refresh(db_risk)
-    return db_risk
-
-def delete_risk(db: Session, risk_id: int):
-    """
-    Elimina un riesgo existente
-    """
-    db_risk = db.query(models.Risk).filter(models.Risk.id == risk_id).first()
-    if db_risk:
-        db.delete(db_risk)
-        db.commit()
-    return db_risk
-
-def update_risk_recommendations(db: Session, risk_id: int, custom_recommendations: str = None):
-    """
-    Actualiza las recomendaciones de un riesgo, opcionalmente con recomendaciones personalizadas
-    """
-    db_risk = db.query(models.Risk).filter(models.Risk.id == risk_id).first()
-    if not db_risk:
-        return None
-    
-    if custom_recommendations:
-        # Usar recomendaciones personalizadas
-        db_risk.recommendations = custom_recommendations
-    else:
-        # Recalcular recomendaciones automáticas
-        new_recommendations = get_risk_recommendations(
-            db_risk.risk_level, db_risk.probability, db_risk.impact
-        )
-        db_risk.recommendations = new_recommendations
-    
-    db.commit()
-    db.refresh(db_risk)
-    return db_risk
-
-def risk_to_dict(risk):
-    """Convierte un objeto Risk a diccionario para templates"""
-    return {
-        "id": risk.id,
-        "title": risk.title,
-        "description": risk.description,
-        "probability": risk.probability,
-        "impact": risk.impact,
-        "risk_level": risk.risk_level.value if risk.risk_level else "UNKNOWN",
-        "status": risk.status.value if risk.status else "UNKNOWN",
-        "owner": risk.owner,
-        "mitigation_plan": risk.mitigation_plan,
-        "recommendations": risk.recommendations,
-        "category_id": risk.category_id,
-        "created_at": risk.created_at.strftime('%d/%m/%Y %H:%M') if risk.created_at else "N/A"
-    }
-
-# CRUD operations for RiskCategory
-def create_category(db: Session, category: schemas.RiskCategoryCreate):
-    """
-    Crea una nueva categoría de riesgo
-    """
-    db_category = models.RiskCategory(**category.dict())
-    db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
-    return db_category
-
-def get_categories(db: Session, skip: int = 0, limit: int = 100):
-    """
-    Obtiene todas las categorías de riesgo
-    """
-    return db.query(models.RiskCategory).offset(skip).limit(limit).all()
-
-def get_category(db: Session, category_id: int):
-    """
-    Obtiene una categoría específica por ID
-    """
-    return db.query(models.RiskCategory).filter(models.RiskCategory.id == category_id).first()
-
-def update_category(db: Session, category_id: int, category_update: schemas.RiskCategoryCreate):
-    """
-    Actualiza una categoría existente
-    """
-    db_category = db.query(models.RiskCategory).filter(models.RiskCategory.id == category_id).first()
-    if not db_category:
-        return None
-    
-    for field, value in category_update.dict().items():
-        setattr(db_category, field, value)
-    
-    db.commit()
-    db.refresh(db_category)
-    return db_category
-
-def delete_category(db: Session, category_id: int):
-    """
-    Elimina una categoría existente
-    """
-    db_category = db.query(models.RiskCategory).filter(models.RiskCategory.id == category_id).first()
-    if db_category:
-        db.delete(db_category)
-        db.commit()
-    return db_category
-
-# Funciones adicionales para análisis y reportes
-def get_risk_stats(db: Session):
-    """
-    Obtiene estadísticas generales de riesgos
-    """
-    total = db.query(models.Risk).count()
-    open_count = db.query(models.Risk).filter(models.Risk.status == models.RiskStatus.OPEN).count()
-    in_progress_count = db.query(models.Risk).filter(models.Risk.status == models.RiskStatus.IN_PROGRESS).count()
-    closed_count = db.query(models.Risk).filter(models.Risk.status == models.RiskStatus.CLOSED).count()
-    mitigated_count = db.query(models.Risk).filter(models.Risk.status == models.RiskStatus.MITIGATED).count()
-    
-    return {
-        "total": total,
-        "open": open_count,
-        "in_progress": in_progress_count,
-        "closed": closed_count,
-        "mitigated": mitigated_count
-    }
-
-def get_risks_by_level(db: Session):
-    """
-    Obtiene conteo de riesgos por nivel
-    """
-    return db.query(
-        models.Risk.risk_level,
-        db.func.count(models.Risk.id)
-    ).group_by(models.Risk.risk_level).all()
\ No newline at end of file
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import String, and_, bindparam, case, func, insert, literal, null, or_, select, text, tuple_, type_coerce, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+from . import models, schemas, search
+from .category_cache import category_cache
+from .recommendation_cache import Template, recommendation_templates
+from .events import risk_events
+
+# Escala de probabilidad e impacto (1-5): solo existen 25 combinaciones posibles
+SCALE_MIN = 1
+SCALE_MAX = 5
+
+class RiskThresholds(NamedTuple):
+    """Puntaje máximo (probabilidad × impacto) de cada nivel; lo demás es CRITICAL"""
+    low: int = 4
+    medium: int = 10
+    high: int = 20
+
+class ScoreCell(NamedTuple):
+    """Resultado precalculado para una combinación de probabilidad e impacto"""
+    level: schemas.RiskLevel
+    recommendations: str
+    detailed_recommendations: str
+
+class ScoringTable(NamedTuple):
+    thresholds: RiskThresholds
+    cells: Tuple[ScoreCell, ...]
+
+def _level_for_score(score: int, thresholds: RiskThresholds) -> schemas.RiskLevel:
+    if score <= thresholds.low:
+        return schemas.RiskLevel.LOW
+    elif score <= thresholds.medium:
+        return schemas.RiskLevel.MEDIUM
+    elif score <= thresholds.high:
+        return schemas.RiskLevel.HIGH
+    else:
+        return schemas.RiskLevel.CRITICAL
+
+# Traducción del enum de nivel del modelo al de la API
+API_LEVEL = {level: schemas.RiskLevel(level.value) for level in models.RiskLevel}
+
+def _as_api_level(risk_level) -> schemas.RiskLevel:
+    """Acepta tanto el enum del modelo como el de la API"""
+    return API_LEVEL.get(risk_level) or schemas.RiskLevel(risk_level)
+
+def compile_scoring_table(thresholds: RiskThresholds) -> ScoringTable:
+    """
+    Precalcula nivel y recomendaciones para las 25 celdas de la matriz 5x5.
+    La celda (p, i) queda en la posición (p - 1) * 5 + (i - 1).
+    """
+    if not thresholds.low < thresholds.medium < thresholds.high:
+        raise ValueError("Thresholds must be strictly increasing: low < medium < high")
+
+    cells = []
+    for probability in range(SCALE_MIN, SCALE_MAX + 1):
+        for impact in range(SCALE_MIN, SCALE_MAX + 1):
+            level = _level_for_score(probability * impact, thresholds)
+            cells.append(ScoreCell(
+                level=level,
+                recommendations=_build_risk_recommendations(level, probability, impact),
+                detailed_recommendations=_build_detailed_recommendations(level, probability, impact)
+            ))
+    return ScoringTable(thresholds=thresholds, cells=tuple(cells))
+
+def load_scoring_thresholds(low: int, medium: int, high: int) -> RiskThresholds:
+    """
+    Configura los umbrales de nivel y recompila la tabla de puntuación.
+    El reemplazo es una sola asignación, por lo que es seguro entre hilos.
+    """
+    global _scoring_table
+    thresholds = RiskThresholds(low, medium, high)
+    _scoring_table = compile_scoring_table(thresholds)
+    return thresholds
+
+def get_scoring_thresholds() -> RiskThresholds:
+    return _scoring_table.thresholds
+
+def _thresholds_from_env() -> RiskThresholds:
+    """Lee RISK_LEVEL_THRESHOLDS con el formato "bajo,medio,alto" (p. ej. "4,10,20")"""
+    raw = os.getenv("RISK_LEVEL_THRESHOLDS")
+    if not raw:
+        return RiskThresholds()
+    return RiskThresholds(*(int(value) for value in raw.split(",")))
+
+def _cell_index(probability: int, impact: int) -> int:
+    """Posición de la celda (probabilidad, impacto) en ScoringTable.cells"""
+    return (probability - SCALE_MIN) * (SCALE_MAX - SCALE_MIN + 1) + impact - SCALE_MIN
+
+def _score_cell(probability: int, impact: int) -> Optional[ScoreCell]:
+    if probability is None or impact is None:
+        return None
+    if SCALE_MIN <= probability <= SCALE_MAX and SCALE_MIN <= impact <= SCALE_MAX:
+        return _scoring_table.cells[_cell_index(probability, impact)]
+    return None
+
+def calculate_risk_level(probability: int, impact: int) -> schemas.RiskLevel:
+    """
+    Calcula el nivel de riesgo basado en probabilidad e impacto.
+    Formula: Puntuación = Probabilidad × Impacto
+    """
+    cell = _score_cell(probability, impact)
+    if cell is not None:
+        return cell.level
+    return _level_for_score(probability * impact, _scoring_table.thresholds)
+
+def get_risk_recommendations(risk_level: schemas.RiskLevel, probability: int, impact: int) -> str:
+    """
+    Obtiene las recomendaciones automáticas desde la tabla precalculada
+    """
+    cell = _score_cell(probability, impact)
+    if cell is not None and cell.level is risk_level:
+        return cell.recommendations
+    risk_level = _as_api_level(risk_level)
+    if cell is not None and cell.level == risk_level:
+        return cell.recommendations
+    return _build_risk_recommendations(risk_level, probability, impact)
+
+def get_detailed_recommendations(risk_level: schemas.RiskLevel, probability: int, impact: int) -> str:
+    """
+    Obtiene las recomendaciones detalladas desde la tabla precalculada
+    """
+    cell = _score_cell(probability, impact)
+    if cell is not None and cell.level is risk_level:
+        return cell.detailed_recommendations
+    risk_level = _as_api_level(risk_level)
+    if cell is not None and cell.level == risk_level:
+        return cell.detailed_recommendations
+    return _build_detailed_recommendations(risk_level, probability, impact)
+
+def _build_risk_recommendations(risk_level: schemas.RiskLevel, probability: int, impact: int) -> str:
+    """
+    Genera recomendaciones automáticas basadas en el nivel de riesgo,
+    probabilidad e impacto.
+    """
+    score = probability * impact
+    
+    recommendations = {
+        schemas.RiskLevel.LOW: [
+            "Monitoreo periódico del riesgo",
+            "Documentar en registro de riesgos",
+            "Revisar en reuniones trimestrales",
+            "Mantener en observación"
+        ],
+        schemas.RiskLevel.MEDIUM: [
+            "Asignar responsable específico",
+            "Definir plan de acción con fechas límite",
+            "Monitoreo mensual del riesgo",
+            "Establecer indicadores de control (KPIs)",
+            "Reportar en reuniones mensuales de equipo",
+            "Evaluar controles preventivos"
+        ],
+        schemas.RiskLevel.HIGH: [
+            "Plan de mitigación inmediato requerido",
+            "Asignar recursos y presupuesto específicos",
+            "Monitoreo semanal con reportes ejecutivos",
+            "Reporte directo a gerencia y stakeholders",
+            "Definir triggers de escalamiento claro",
+            "Evaluar transferencia del riesgo (seguros)",
+            "Desarrollar plan de contingencia detallado"
+        ],
+        schemas.RiskLevel.CRITICAL: [
+            "¡Acción inmediata requerida!",
+            "Escalar a comité de crisis o directiva",
+            "Asignar presupuesto de emergencia",
+            "Monitoreo diario con reportes ejecutivos",
+            "Plan de contingencia activado inmediatamente",
+            "Comunicación constante con todos los stakeholders",
+            "Considerar evitación completa del riesgo",
+            "Reuniones diarias de seguimiento"
+        ]
+    }
+    
+    # Recomendaciones base según el nivel
+    base_recommendations = recommendations.get(risk_level, [])
+    
+    # Recomendaciones adicionales basadas en características específicas
+    additional_recommendations = []
+    
+    if probability >= 4:
+        additional_recommendations.extend([
+            "Implementar controles preventivos inmediatos",
+            "Aumentar frecuencia de monitoreo",
+            "Capacitar equipo en procedimientos de emergencia"
+        ])
+    
+    if impact >= 4:
+        additional_recommendations.extend([
+            "Desarrollar plan de contingencia detallado",
+            "Identificar recursos alternativos",
+            "Establecer comunicaciones de crisis"
+        ])
+    
+    if score > 15:
+        additional_recommendations.append("Realizar análisis de root cause completo")
+    
+    if probability == 5 and impact == 5:
+        additional_recommendations.extend([
+            "Activación inmediata de protocolo de crisis",
+            "Notificación a autoridades si aplica",
+            "Asignación de equipo dedicado full-time"
+        ])
+    
+    # Combinar todas las recomendaciones
+    all_recommendations = base_recommendations + additional_recommendations
+    
+    return "; ".join(all_recommendations)
+
+def _build_detailed_recommendations(risk_level: schemas.RiskLevel, probability: int, impact: int) -> str:
+    """
+    Genera recomendaciones más detalladas y formateadas para respuestas específicas
+    """
+    score = probability * impact
+    
+    urgency_levels = {
+        schemas.RiskLevel.LOW: "BAJA URGENCIA",
+        schemas.RiskLevel.MEDIUM: "URGENCIA MODERADA",
+        schemas.RiskLevel.HIGH: "ALTA URGENCIA",
+        schemas.RiskLevel.CRITICAL: "URGENCIA CRÍTICA"
+    }
+    
+    detailed_recommendations = f"""
+ANÁLISIS DE RIESGO - RECOMENDACIONES ESPECÍFICAS
+=============================================
+
+NIVEL DE RIESGO: {risk_level.value}
+PUNTAJE: {score} (Probabilidad: {probability}/5 × Impacto: {impact}/5)
+NIVEL DE URGENCIA: {urgency_levels.get(risk_level, 'NO DEFINIDO')}
+
+RECOMENDACIONES PRINCIPALES:
+----------------------------
+"""
+    
+    if risk_level == schemas.RiskLevel.LOW:
+        detailed_recommendations += """
+• Monitoreo trimestral mediante checklist
+• Mantener documentación en registro oficial
+• Revisar en reuniones de equipo mensuales
+• Evaluar en revisiones periódicas de proceso
+"""
+    elif risk_level == schemas.RiskLevel.MEDIUM:
+        detailed_recommendations += """
+• Asignar responsable específico con autoridad
+• Desarrollar plan de acción con cronograma de 30 días
+• Monitoreo mensual con reportes formales
+• Establecer KPIs de control específicos
+• Incluir en reportes de gestión mensuales
+"""
+    elif risk_level == schemas.RiskLevel.HIGH:
+        detailed_recommendations += """
+• Plan de mitigación a implementar en máximo 7 días
+• Asignar recursos dedicados y presupuesto
+• Monitoreo semanal con reportes ejecutivos
+• Comunicación directa con alta gerencia
+• Desarrollar plan de contingencia operativo
+• Evaluar opciones de transferencia de riesgo
+"""
+    elif risk_level == schemas.RiskLevel.CRITICAL:
+        detailed_recommendations += """
+• ACCIÓN INMEDIATA REQUERIDA (menos de 48 horas)
+• Activación de comité de crisis
+• Presupuesto de emergencia asignado
+• Monitoreo diario con reportes horarios si es necesario
+• Plan de contingencia activado inmediatamente
+• Comunicación constante con stakeholders clave
+• Considerar parada de operaciones si aplica
+"""
+
+    # Recomendaciones adicionales basadas en score
+    if score > 18:
+        detailed_recommendations += """
+RECOMENDACIONES ADICIONALES POR ALTO PUNTAJE:
+---------------------------------------------
+• Reunión urgente con comité directivo
+• Evaluar parar actividades relacionadas temporalmente
+• Notificar a autoridades regulatorias si aplica
+• Activar plan de comunicación de crisis
+"""
+
+    if probability >= 4:
+        detailed_recommendations += """
+CONTROLES PREVENTIVOS RECOMENDADOS:
+-----------------------------------
+• Implementar controles preventivos inmediatos
+• Aumentar frecuencia de auditorías
+• Capacitación intensiva del personal
+• Redundancia en sistemas críticos
+"""
+
+    detailed_recommendations += f"""
+PRÓXIMOS PASOS SUGERIDOS:
+-------------------------
+1. Revisar y priorizar recomendaciones
+2. Asignar responsables y fechas límite
+3. Establecer sistema de monitoreo
+4. Programar seguimiento en { '30 días' if risk_level == schemas.RiskLevel.LOW else '15 días' if risk_level == schemas.RiskLevel.MEDIUM else '7 días' if risk_level == schemas.RiskLevel.HIGH else '24 horas' }
+5. Documentar lecciones aprendidas
+"""
+
+    return detailed_recommendations
+
+_scoring_table = compile_scoring_table(_thresholds_from_env())
+
+
+# Plantillas de recomendaciones (ver models.RecommendationTemplate)
+def _template_values(risk_level, probability: int, impact: int) -> dict:
+    """
+    Valores de columna de las recomendaciones automáticas de un riesgo: la
+    referencia a su plantilla o, si la celda no tiene plantilla (valores
+    fuera de la escala), el texto calculado como recomendación propia
+    """
+    level = _as_api_level(risk_level)
+    template_id = recommendation_templates.id_for(level.value, probability, impact)
+    if template_id is not None:
+        return {"recommendation_template_id": template_id, "custom_recommendations": None}
+    return {
+        "recommendation_template_id": None,
+        "custom_recommendations": get_risk_recommendations(level, probability, impact)
+    }
+
+def load_recommendation_templates(db: Session) -> int:
+    """
+    Sincroniza las plantillas con _build_risk_recommendations para cada
+    (nivel, probabilidad, impacto) y carga la caché en memoria. Si cambió el
+    texto de una plantilla se incrementa la versión de los riesgos que la
+    usan y se reconstruye el índice de búsqueda. Retorna cuántas plantillas
+    se crearon o cambiaron.
+    """
+    existing = {
+        (template.risk_level, template.probability, template.impact): template
+        for template in db.query(models.RecommendationTemplate)
+    }
+    created = []
+    changed_ids = []
+    for level in schemas.RiskLevel:
+        for probability in range(SCALE_MIN, SCALE_MAX + 1):
+            for impact in range(SCALE_MIN, SCALE_MAX + 1):
+                model_level = models.RiskLevel(level.value)
+                text_value = _build_risk_recommendations(level, probability, impact)
+                template = existing.get((model_level, probability, impact))
+                if template is None:
+                    created.append({
+                        "risk_level": model_level, "probability": probability,
+                        "impact": impact, "text": text_value
+                    })
+                elif template.text != text_value:
+                    template.text = text_value
+                    changed_ids.append(template.id)
+
+    if created:
+        db.execute(insert(models.RecommendationTemplate), created)
+    if changed_ids:
+        change_seq = bump_collection_version(db, RISKS_COLLECTION)
+        db.execute(
+            update(models.Risk)
+            .where(models.Risk.recommendation_template_id.in_(changed_ids))
+            .values(version=models.Risk.version + 1, change_seq=change_seq),
+            execution_options={"synchronize_session": False}
+        )
+        search.rebuild_fts(db.connection())
+    db.commit()
+
+    recommendation_templates.replace(
+        Template(template.id, template.risk_level.value, template.probability, template.impact, template.text)
+        for template in db.query(models.RecommendationTemplate)
+    )
+    return len(created) + len(changed_ids)
+
+def dedupe_recommendations(db: Session) -> int:
+    """
+    Migración: reemplaza el texto guardado en cada riesgo por la referencia a
+    la plantilla de su celda cuando coincide exactamente. El texto que no
+    coincide (personalizado o de una política anterior) se conserva. No
+    cambia el contenido visible, así que no incrementa versiones ni updated_at.
+    Retorna la cantidad de riesgos migrados.
+    """
+    risks = models.Risk.__table__
+    templates = models.RecommendationTemplate.__table__
+    template_id = select(templates.c.id).where(
+        templates.c.risk_level == risks.c.risk_level,
+        templates.c.probability == risks.c.probability,
+        templates.c.impact == risks.c.impact,
+        templates.c.text == risks.c.recommendations
+    ).scalar_subquery()
+    result = db.execute(
+        update(risks)
+        .where(
+            risks.c.recommendation_template_id.is_(None),
+            risks.c.recommendations.is_not(None),
+            template_id.is_not(None)
+        )
+        .values(
+            recommendation_template_id=template_id,
+            recommendations=None,
+            updated_at=risks.c.updated_at
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+# Marca en collection_versions de que la migración ya corrió en esta base
+RECOMMENDATIONS_DEDUPE_MARKER = "recommendations-dedupe"
+
+def dedupe_recommendations_once(db: Session) -> Optional[int]:
+    """
+    Ejecuta dedupe_recommendations la primera vez (al iniciar la aplicación)
+    y guarda la marca; después retorna None sin recorrer la tabla. Para
+    repetirla se usa python -m app.manage dedupe-recommendations.
+    """
+    if get_collection_version(db, RECOMMENDATIONS_DEDUPE_MARKER):
+        return None
+    migrated = dedupe_recommendations(db)
+    bump_collection_version(db, RECOMMENDATIONS_DEDUPE_MARKER)
+    db.commit()
+    return migrated
+
+def get_recommendation_templates():
+    return recommendation_templates.templates
+
+
+# Versiones de colección: cada escritura incrementa el contador de su
+# colección dentro de la misma transacción (ver models.CollectionVersion)
+RISKS_COLLECTION = "risks"
+CATEGORIES_COLLECTION = "categories"
+
+def bump_collection_version(db: Session, name: str) -> int:
+    """Incrementa el contador de la colección y retorna el nuevo valor"""
+    statement = sqlite_insert(models.CollectionVersion).values(name=name, version=1)
+    return db.execute(statement.on_conflict_do_update(
+        index_elements=[models.CollectionVersion.name],
+        set_={"version": models.CollectionVersion.version + 1}
+    ).returning(models.CollectionVersion.version)).scalar_one()
+
+def get_collection_version(db: Session, name: str) -> int:
+    """Obtiene el contador de cambios de una colección (0 si nunca cambió)"""
+    version = db.query(models.CollectionVersion.version).filter(
+        models.CollectionVersion.name == name
+    ).scalar()
+    return version or 0
+
+def get_risk_version(db: Session, risk_id: int) -> Optional[int]:
+    """Obtiene solo la versión de un riesgo, o None si no existe"""
+    return db.query(models.Risk.version).filter(models.Risk.id == risk_id).scalar()
+
+# Historial de riesgos y tendencias
+HISTORY_FIELDS = {"probability", "impact", "risk_level", "status"}
+HISTORY_SNAPSHOT_COLUMNS = (
+    models.Risk.id.label("risk_id"),
+    models.Risk.probability,
+    models.Risk.impact,
+    models.Risk.risk_level,
+    models.Risk.status,
+)
+# Cantidad de instantáneas recientes usadas para calcular la tendencia
+TREND_WINDOW = 5
+# Pendiente mínima del puntaje (por instantánea) para considerar un cambio
+TREND_TOLERANCE = 0.5
+
+def _record_history(db: Session, risk):
+    """Agrega una instantánea del estado actual del riesgo al historial"""
+    db.add(models.RiskHistory(
+        risk_id=risk.id,
+        probability=risk.probability,
+        impact=risk.impact,
+        risk_level=risk.risk_level,
+        status=to_model_status(risk.status) if risk.status else None
+    ))
+
+def _trend_from_scores(scores):
+    """
+    Calcula la tendencia a partir de los puntajes, del más reciente al más
+    antiguo, con la pendiente de mínimos cuadrados. Retorna (tendencia,
+    puntaje proyectado para el próximo cambio).
+    """
+    points = list(reversed(scores))
+    n = len(points)
+    if n < 2:
+        return "stable", points[-1]
+    mean_x = (n - 1) / 2
+    mean_y = sum(points) / n
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(points)) / \
+        sum((x - mean_x) ** 2 for x in range(n))
+    if slope <= -TREND_TOLERANCE:
+        trend = "improving"
+    elif slope >= TREND_TOLERANCE:
+        trend = "worsening"
+    else:
+        trend = "stable"
+    projected = round(points[-1] + slope)
+    return trend, min(max(projected, SCALE_MIN ** 2), SCALE_MAX ** 2)
+
+def _recent_history_scores(db: Session, risk_ids, window: int):
+    """
+    Obtiene los puntajes de las últimas `window` instantáneas de cada riesgo
+    (del más reciente al más antiguo) con ROW_NUMBER() sobre el índice
+    (risk_id, changed_at), sin recorrer el historial completo.
+    """
+    ranked = select(
+        models.RiskHistory.risk_id,
+        (models.RiskHistory.probability * models.RiskHistory.impact).label("score"),
+        func.row_number().over(
+            partition_by=models.RiskHistory.risk_id,
+            order_by=(models.RiskHistory.changed_at.desc(), models.RiskHistory.id.desc())
+        ).label("position")
+    ).where(models.RiskHistory.risk_id.in_(risk_ids)).subquery()
+
+    rows = db.execute(
+        select(ranked.c.risk_id, ranked.c.score)
+        .where(ranked.c.position <= window)
+        .order_by(ranked.c.risk_id, ranked.c.position)
+    )
+    scores = {}
+    for risk_id, score in rows:
+        scores.setdefault(risk_id, []).append(score)
+    return scores
+
+def _analyze_trend(risk_level, probability, impact, scores):
+    # Riesgos anteriores al historial solo tienen su estado actual
+    scores = scores or [probability * impact]
+    trend, projected = _trend_from_scores(scores)
+    current_level = _as_api_level(risk_level)
+    predicted_level = _level_for_score(projected, get_scoring_thresholds())
+    return current_level, predicted_level, trend, scores
+
+def get_risk_history(db: Session, risk_id: int, limit: int = TREND_WINDOW):
+    """Obtiene las últimas instantáneas de un riesgo, de la más reciente a la más antigua"""
+    return db.query(models.RiskHistory).filter(
+        models.RiskHistory.risk_id == risk_id
+    ).order_by(models.RiskHistory.changed_at.desc(), models.RiskHistory.id.desc()).limit(limit).all()
+
+def get_risk_analysis(db: Session, risk_id: int, window: int = TREND_WINDOW):
+    """
+    Construye schemas.RiskAnalysis: tendencia y nivel proyectado a partir de
+    las últimas instantáneas del historial
+    """
+    db_risk = get_risk(db, risk_id)
+    if db_risk is None:
+        return None
+    scores = _recent_history_scores(db, [risk_id], window).get(risk_id)
+    current_level, predicted_level, trend, _ = _analyze_trend(
+        db_risk.risk_level, db_risk.probability, db_risk.impact, scores
+    )
+    return {
+        "risk_id": db_risk.id,
+        "title": db_risk.title,
+        "current_level": current_level,
+        "predicted_level": predicted_level,
+        "trend": trend,
+        "recommendations": [item for item in (db_risk.recommendations or "").split("; ") if item],
+        "action_plan": db_risk.mitigation_plan
+    }
+
+def get_risk_trends(db: Session, skip: int = 0, limit: int = 100, filters=None,
+                    window: int = TREND_WINDOW):
+    """
+    Calcula la tendencia de una página de riesgos con una consulta de
+    ventana sobre el historial de esos riesgos únicamente
+    """
+    query = _apply_risk_filters(
+        db.query(models.Risk.id, models.Risk.risk_level, models.Risk.probability, models.Risk.impact),
+        filters
+    )
+    risks = query.order_by(models.Risk.id).offset(skip).limit(limit).all()
+    history = _recent_history_scores(db, [risk.id for risk in risks], window) if risks else {}
+
+    trends = []
+    for risk in risks:
+        current_level, predicted_level, trend, scores = _analyze_trend(
+            risk.risk_level, risk.probability, risk.impact, history.get(risk.id)
+        )
+        trends.append({
+            "risk_id": risk.id,
+            "current_level": current_level,
+            "predicted_level": predicted_level,
+            "trend": trend,
+            "snapshots": len(scores)
+        })
+    return trends
+
+# Eventos de cambios para GET /risks/events (se publican después del commit)
+def _risk_event_payload(risk) -> dict:
+    """Columnas de la fila de la lista de riesgos, para aplicar el cambio en el cliente"""
+    return {
+        "id": risk.id,
+        "title": risk.title,
+        "risk_level": _as_api_level(risk.risk_level).value if risk.risk_level else None,
+        "probability": risk.probability,
+        "impact": risk.impact,
+        "owner": risk.owner,
+        "status": API_STATUS[to_model_status(risk.status)].value if risk.status else None,
+        "category_id": risk.category_id,
+        "category_name": category_cache.names.get(risk.category_id),
+    }
+
+def _publish_risk_event(event_type: str, version: int, risk=None, risk_id: int = None):
+    risk_events.publish({
+        "type": event_type,
+        "version": version,
+        "id": risk.id if risk is not None else risk_id,
+        "risk": _risk_event_payload(risk) if risk is not None else None,
+    })
+
+def _publish_bulk_event(version: int, count: int):
+    # Los cambios masivos no se envían fila por fila: el cliente recarga la lista
+    risk_events.publish({"type": "bulk", "version": version, "count": count})
+
+# CRUD operations for Risk
+def create_risk(db: Session, risk: schemas.RiskCreate):
+    risk_level = calculate_risk_level(risk.probability, risk.impact)
+    version = bump_collection_version(db, RISKS_COLLECTION)
+    
+    # Un único INSERT ... RETURNING trae también los valores por defecto del
+    # servidor (created_at, version), sin el SELECT de db.refresh
+    db_risk = db.execute(
+        insert(models.Risk).values(
+            **risk.dict(),
+            risk_level=risk_level,
+            status=models.RiskStatus.OPEN,
+            change_seq=version,
+            **_template_values(risk_level, risk.probability, risk.impact)  # ← Referencia a la plantilla
+        ).returning(models.Risk)
+    ).scalar_one()
+    _record_history(db, db_risk)
+    _commit_detached(db, db_risk)
+    _publish_risk_event("created", version, db_risk)
+    return db_risk
+
+# schemas.RiskStatus y models.RiskStatus no comparten nombres; este mapa
+# traduce el estado de la API al valor que se guarda en la base de datos
+MODEL_STATUS = {
+    schemas.RiskStatus.OPEN: models.RiskStatus.OPEN,
+    schemas.RiskStatus.IN_PROGRESS: models.RiskStatus.ENPROGRESS,
+    schemas.RiskStatus.CLOSED: models.RiskStatus.CIERRA,
+    schemas.RiskStatus.MITIGATED: models.RiskStatus.MITIGATED,
+}
+
+# Inverso de MODEL_STATUS: del valor guardado al estado de la API
+API_STATUS = {model: api for api, model in MODEL_STATUS.items()}
+
+def to_model_status(status) -> models.RiskStatus:
+    """
+    Convierte un estado de la API (o su texto) al enum del modelo
+    """
+    if isinstance(status, models.RiskStatus):
+        return status
+    return MODEL_STATUS[schemas.RiskStatus(status)]
+
+def _apply_risk_filters(query, filters=None):
+    """
+    Aplica los filtros de schemas.RiskFilter (o un dict equivalente) a una
+    consulta de riesgos. Cada filtro está respaldado por un índice de models.Risk.
+    """
+    if not filters:
+        return query
+    if isinstance(filters, schemas.RiskFilter):
+        filters = filters.dict(exclude_none=True)
+
+    if filters.get('category_id') is not None:
+        query = query.filter(models.Risk.category_id == filters['category_id'])
+    if filters.get('risk_level') is not None:
+        query = query.filter(models.Risk.risk_level == filters['risk_level'])
+    if filters.get('status') is not None:
+        query = query.filter(models.Risk.status == to_model_status(filters['status']))
+    if filters.get('probability_min') is not None:
+        query = query.filter(models.Risk.probability >= filters['probability_min'])
+    if filters.get('probability_max') is not None:
+        query = query.filter(models.Risk.probability <= filters['probability_max'])
+    if filters.get('impact_min') is not None:
+        query = query.filter(models.Risk.impact >= filters['impact_min'])
+    if filters.get('impact_max') is not None:
+        query = query.filter(models.Risk.impact <= filters['impact_max'])
+    if filters.get('owner'):
+        query = query.filter(models.Risk.owner.ilike(f"%{filters['owner']}%"))
+    return query
+
+def search_risks(db: Session, q: str, limit: int = 20, filters=None):
+    """
+    Búsqueda de texto completo en título, descripción, plan de mitigación y
+    recomendaciones usando el índice FTS5, ordenada por relevancia (bm25).
+    Admite prefijos ("cifr*") y se combina con los filtros estructurados.
+    Retorna una lista de (riesgo, rank, snippet) o ValueError si q está vacío.
+    """
+    expression = search.build_match_query(q)
+    if not expression:
+        raise ValueError("Empty search query")
+
+    rank = search.rank().label("rank")
+    query = (
+        db.query(models.Risk, rank, search.snippet().label("snippet"))
+        .select_from(search.risks_fts)
+        .join(models.Risk, models.Risk.id == search.risks_fts.c.rowid)
+        .filter(search.match(expression))
+    )
+    query = _apply_risk_filters(query, filters)
+    rows = query.order_by(rank).limit(limit).all()
+    return [(risk, rank, search.highlight_html(fragment)) for risk, rank, fragment in rows]
+
+def explain_risks_query(db: Session, filters=None):
+    """
+    Devuelve el plan de ejecución de SQLite (EXPLAIN QUERY PLAN) para la
+    consulta filtrada de riesgos, útil para verificar que se usan los índices
+    """
+    query = _apply_risk_filters(db.query(models.Risk), filters)
+    statement = query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+    return [row.detail for row in rows]
+
+# Valor de prueba de cada filtro de schemas.RiskFilter para check_risk_query_plans
+PLAN_CHECK_FILTERS = {
+    "category_id": 1,
+    "risk_level": schemas.RiskLevel.HIGH.value,
+    "status": schemas.RiskStatus.OPEN.value,
+    "probability_min": 3,
+    "probability_max": 3,
+    "impact_min": 3,
+    "impact_max": 3,
+}
+# Filtros que ningún índice puede resolver: owner busca una subcadena (ILIKE '%...%')
+PLAN_CHECK_EXEMPT = {"owner"}
+
+def check_risk_query_plans(db: Session):
+    """
+    Comprueba que cada filtro de schemas.RiskFilter se resuelve con un índice
+    (USING INDEX y ningún SCAN risks). Un filtro nuevo sin valor de prueba
+    ni exención también falla. Retorna una lista de (filtro, plan, error o None).
+    """
+    results = []
+    for name in schemas.RiskFilter.model_fields:
+        if name in PLAN_CHECK_EXEMPT:
+            continue
+        if name not in PLAN_CHECK_FILTERS:
+            results.append((name, [], "no test value in PLAN_CHECK_FILTERS"))
+            continue
+        plan = explain_risks_query(db, {name: PLAN_CHECK_FILTERS[name]})
+        error = None
+        if any(detail.startswith("SCAN risks") for detail in plan):
+            error = "full table scan"
+        elif not any("USING INDEX" in detail or "USING COVERING INDEX" in detail for detail in plan):
+            error = "no index used"
+        results.append((name, plan, error))
+    return results
+
+def bulk_create_risks(db: Session, records, batch_size: int = 500, max_errors: int = 1000):
+    """
+    Inserta riesgos de forma masiva a partir de un iterable de
+    (número de registro, datos). Cada registro se valida con schemas.RiskCreate,
+    el nivel y las recomendaciones salen de la tabla de puntuación y las filas
+    válidas se insertan con executemany en transacciones de `batch_size` filas.
+    Retorna un dict con el formato de schemas.BulkImportResult.
+    """
+    category_ids = {row.id for row in db.query(models.RiskCategory.id)}
+    result = {"inserted": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    def report(number, message):
+        result["failed"] += 1
+        if len(result["errors"]) < max_errors:
+            result["errors"].append({"row": number, "error": message})
+        else:
+            result["errors_truncated"] = True
+
+    def flush(batch):
+        try:
+            version = bump_collection_version(db, RISKS_COLLECTION)
+            inserted = db.execute(
+                insert(models.Risk).returning(*HISTORY_SNAPSHOT_COLUMNS),
+                [{**values, "change_seq": version} for _, values in batch]
+            )
+            db.execute(insert(models.RiskHistory), [row._asdict() for row in inserted])
+            db.commit()
+            result["inserted"] += len(batch)
+            _publish_bulk_event(version, len(batch))
+        except SQLAlchemyError as exc:
+            db.rollback()
+            for number, _ in batch:
+                report(number, f"Database error: {exc.__class__.__name__}")
+
+    batch = []
+    for number, data in records:
+        if isinstance(data, Exception):
+            report(number, str(data))
+            continue
+        if not isinstance(data, dict):
+            report(number, "Record must be an object")
+            continue
+        try:
+            risk = schemas.RiskCreate(**data)
+        except ValidationError as exc:
+            report(number, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in exc.errors()
+            ))
+            continue
+        if risk.category_id not in category_ids:
+            report(number, f"category_id: Category {risk.category_id} not found")
+            continue
+
+        risk_level = calculate_risk_level(risk.probability, risk.impact)
+        batch.append((number, {
+            **risk.dict(),
+            "risk_level": risk_level,
+            "status": models.RiskStatus.OPEN,
+            **_template_values(risk_level, risk.probability, risk.impact),
+        }))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+
+    if batch:
+        flush(batch)
+    return result
+
+# Columnas incluidas en la exportación del registro de riesgos
+EXPORT_COLUMNS = (
+    models.Risk.id,
+    models.Risk.title,
+    models.Risk.description,
+    models.Risk.probability,
+    models.Risk.impact,
+    models.Risk.risk_level,
+    models.Risk.status,
+    models.Risk.owner,
+    models.Risk.mitigation_plan,
+    models.Risk.recommendations,
+    models.Risk.category_id,
+    models.Risk.created_at,
+    models.Risk.updated_at,
+)
+
+def _export_value(value):
+    if isinstance(value, models.RiskStatus):
+        return API_STATUS[value].value
+    if isinstance(value, models.RiskLevel):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def iter_risk_export(db: Session, filters=None, chunk_size: int = 1000):
+    """
+    Recorre los riesgos filtrados en bloques de `chunk_size` filas usando un
+    cursor del lado del servidor (yield_per), sin materializar la lista ni
+    crear objetos ORM. Genera listas de tuplas con valores ya serializables.
+    """
+    statement = _apply_risk_filters(select(*EXPORT_COLUMNS), filters).order_by(models.Risk.id)
+    result = db.execute(statement.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        yield [tuple(_export_value(value) for value in row) for row in partition]
+
+def get_risks(db: Session, skip: int = 0, limit: int = 100, filters=None):
+    """
+    Obtiene todos los riesgos con filtros opcionales
+    """
+    query = _apply_risk_filters(db.query(models.Risk), filters)
+    return query.offset(skip).limit(limit).all()
+
+# Columnas de schemas.Risk en el orden de sus campos, para armar la lista
+# directamente desde las filas sin cargar objetos ORM
+RISK_LIST_COLUMNS = (
+    models.Risk.title,
+    models.Risk.description,
+    models.Risk.probability,
+    models.Risk.impact,
+    models.Risk.owner,
+    models.Risk.mitigation_plan,
+    models.Risk.category_id,
+    models.Risk.id,
+    models.Risk.risk_level,
+    models.Risk.status,
+    models.Risk.custom_recommendations,
+    models.Risk.recommendation_template_id,
+)
+_API_STATUS_VALUES = {model: api.value for model, api in API_STATUS.items()}
+
+def get_risk_rows(db: Session, skip: int = 0, limit: int = 100, filters=None,
+                  recommendations: schemas.RecommendationFormat = schemas.RecommendationFormat.TEXT):
+    """
+    Igual que get_risks, pero retorna dicts con los campos de schemas.Risk
+    ya serializables, armados desde las tuplas de la consulta: sin identity
+    map, sin validación de Pydantic y con el texto de las plantillas
+    resuelto desde la caché en memoria (con ref, solo el texto propio).
+    """
+    statement = _apply_risk_filters(select(*RISK_LIST_COLUMNS), filters).offset(skip).limit(limit)
+    rows = db.execute(statement).all()
+    resolve_template = recommendations == schemas.RecommendationFormat.TEXT
+    template_text = recommendation_templates.text
+    status_values = _API_STATUS_VALUES
+    return [
+        {
+            "title": title,
+            "description": description,
+            "probability": probability,
+            "impact": impact,
+            "owner": owner,
+            "mitigation_plan": mitigation_plan,
+            "category_id": category_id,
+            "id": risk_id,
+            "risk_level": risk_level.value if risk_level is not None else None,
+            "status": status_values[status] if status is not None else None,
+            "recommendations": (
+                custom if custom is not None or not resolve_template else template_text(template_id)
+            ),
+            "recommendation_template_id": template_id,
+        }
+        for (title, description, probability, impact, owner, mitigation_plan, category_id,
+             risk_id, risk_level, status, custom, template_id) in rows
+    ]
+
+# Columnas por las que se puede paginar con cursor. Cada una está respaldada
+# por un índice compuesto (columna, id) definido en models.Risk; risk_level
+# ordena por severidad (LOW < MEDIUM < HIGH < CRITICAL), no por el nombre.
+RISK_SORT_COLUMNS = {
+    schemas.RiskSortKey.ID: models.Risk.id,
+    schemas.RiskSortKey.CREATED_AT: models.Risk.created_at,
+    schemas.RiskSortKey.RISK_LEVEL: models.risk_level_rank(models.Risk.risk_level),
+}
+
+def _cursor_value(risk, sort: schemas.RiskSortKey):
+    """
+    Obtiene el valor de la clave de ordenamiento tal como está almacenado en SQLite
+    """
+    if sort == schemas.RiskSortKey.CREATED_AT:
+        if risk.created_at is None:
+            return None
+        # CURRENT_TIMESTAMP guarda segundos; SQLAlchemy guarda microsegundos
+        fmt = '%Y-%m-%d %H:%M:%S.%f' if risk.created_at.microsecond else '%Y-%m-%d %H:%M:%S'
+        return risk.created_at.strftime(fmt)
+    if sort == schemas.RiskSortKey.RISK_LEVEL:
+        return models.RISK_LEVEL_RANKS.get(models.RiskLevel(risk.risk_level.value), 0) if risk.risk_level else 0
+    return risk.id
+
+def encode_cursor(risk, sort: schemas.RiskSortKey, order: schemas.SortOrder) -> str:
+    """
+    Genera un cursor opaco que apunta justo después del riesgo dado
+    """
+    payload = [sort.value, order.value, _cursor_value(risk, sort), risk.id]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str):
+    """
+    Decodifica un cursor generado por encode_cursor.
+    Lanza ValueError si el cursor no es válido.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort, order, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        sort, order = schemas.RiskSortKey(sort), schemas.SortOrder(order)
+        if not isinstance(last_id, int):
+            raise TypeError(last_id)
+        if sort == schemas.RiskSortKey.RISK_LEVEL and not isinstance(value, int):
+            raise TypeError(value)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    return sort, order, value, last_id
+
+# Sincronización incremental: el token es la posición (change_seq, id) del
+# último cambio entregado; las altas y modificaciones salen de risks y las
+# bajas de risk_tombstones, ambas por su índice (change_seq, id)
+def encode_change_token(change_seq: int, risk_id: int) -> str:
+    raw = json.dumps([change_seq, risk_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_change_token(token: str) -> Tuple[int, int]:
+    """
+    Decodifica un token generado por encode_change_token.
+    Lanza ValueError si el token no es válido.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        change_seq, risk_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not (isinstance(change_seq, int) and isinstance(risk_id, int)):
+            raise TypeError(token)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid change token") from exc
+    return change_seq, risk_id
+
+def get_change_token(db: Session) -> str:
+    """Token de la última posición (change_seq, id) entre riesgos y bajas"""
+    risks = models.Risk.__table__
+    tombstones = models.RiskTombstone.__table__
+    latest = db.execute(
+        select(risks.c.change_seq, risks.c.id)
+        .union_all(select(tombstones.c.change_seq, tombstones.c.risk_id))
+        .order_by(text("change_seq DESC"), text("id DESC"))
+        .limit(1)
+    ).first()
+    return encode_change_token(*latest) if latest else encode_change_token(-1, 0)
+
+def get_risk_changes(db: Session, since: str = None, limit: int = 500):
+    """
+    Riesgos creados, modificados o eliminados después del token `since`
+    (sin token, todos los riesgos existentes), en orden de change_seq.
+    Retorna (riesgos, ids eliminados, token siguiente, hay más).
+
+    Las posiciones se leen con un único UNION ALL para que altas y bajas
+    salgan de la misma instantánea; cualquier escritura posterior recibe un
+    change_seq mayor y aparece en la siguiente llamada.
+    """
+    position = decode_change_token(since) if since else (-1, 0)
+    risks = models.Risk.__table__
+    tombstones = models.RiskTombstone.__table__
+
+    changed = select(
+        risks.c.change_seq, risks.c.id, literal(False).label("deleted")
+    ).where(tuple_(risks.c.change_seq, risks.c.id) > position)
+    # Una carga inicial no necesita las bajas anteriores
+    if since:
+        deleted = select(
+            tombstones.c.change_seq, tombstones.c.risk_id, literal(True)
+        ).where(tuple_(tombstones.c.change_seq, tombstones.c.risk_id) > position)
+        changed = changed.union_all(deleted)
+    entries = db.execute(
+        changed.order_by(text("change_seq"), text("id")).limit(limit + 1)
+    ).all()
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_token = encode_change_token(*entries[-1][:2]) if entries else encode_change_token(*position)
+
+    changed_ids = [entry.id for entry in entries if not entry.deleted]
+    deleted_ids = [entry.id for entry in entries if entry.deleted]
+    # Un riesgo eliminado después de la primera lectura ya tiene su marca
+    # con un change_seq posterior, así que simplemente no se devuelve aquí
+    by_id = {
+        risk.id: risk
+        for risk in db.query(models.Risk).filter(models.Risk.id.in_(changed_ids))
+    } if changed_ids else {}
+    changed_risks = [by_id[risk_id] for risk_id in changed_ids if risk_id in by_id]
+    return changed_risks, deleted_ids, next_token, has_more
+
+def get_risks_page(db: Session, limit: int = 100, cursor: str = None,
+                   sort: schemas.RiskSortKey = schemas.RiskSortKey.CREATED_AT,
+                   order: schemas.SortOrder = schemas.SortOrder.ASC,
+                   filters=None, columns=None):
+    """
+    Obtiene una página de riesgos con paginación por cursor (keyset).
+    En lugar de OFFSET, busca directamente en el índice (clave, id) a partir
+    del último registro entregado, por lo que el costo no crece con la página.
+    Si se indica un cursor, su orden prevalece sobre `sort` y `order`.
+    Con `columns` se retornan filas con esas columnas en lugar de objetos
+    ORM; deben incluir id y la columna de ordenamiento.
+    Retorna (riesgos, next_cursor); next_cursor es None en la última página.
+    """
+    query = _apply_risk_filters(db.query(*(columns or (models.Risk,))), filters)
+    limit = max(limit, 1)
+
+    if cursor:
+        sort, order, value, last_id = decode_cursor(cursor)
+
+    column = RISK_SORT_COLUMNS[sort]
+    descending = order == schemas.SortOrder.DESC
+    if sort == schemas.RiskSortKey.ID:
+        keys = (models.Risk.id,)
+    else:
+        keys = (column, models.Risk.id)
+
+    if cursor:
+        if sort == schemas.RiskSortKey.ID:
+            position = models.Risk.id < last_id if descending else models.Risk.id > last_id
+        else:
+            # Comparar contra el valor crudo almacenado para no depender del
+            # formato de serialización del tipo DateTime; la severidad es entera
+            if sort == schemas.RiskSortKey.RISK_LEVEL:
+                bound = tuple_(literal(value), last_id)
+            else:
+                bound = tuple_(type_coerce(value, String), last_id)
+            position = tuple_(*keys) < bound if descending else tuple_(*keys) > bound
+            if sort == schemas.RiskSortKey.RISK_LEVEL:
+                # SQLite no acota un índice sobre expresión con la comparación de
+                # tuplas; el rango sobre la severidad permite un SEARCH
+                position = and_(column <= value if descending else column >= value, position)
+        query = query.filter(position)
+
+    query = query.order_by(*[key.desc() if descending else key.asc() for key in keys])
+    # Se pide un registro extra para saber si existe una página siguiente
+    risks = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(risks) > limit:
+        risks = risks[:limit]
+        next_cursor = encode_cursor(risks[-1], sort, order)
+    return risks, next_cursor
+
+# Columnas de una fila de la lista HTML (templates/_risk_row.html); version
+# identifica el fragmento renderizado y created_at/risk_level los cursores
+RISK_ROW_COLUMNS = (
+    models.Risk.id,
+    models.Risk.title,
+    models.Risk.probability,
+    models.Risk.impact,
+    models.Risk.risk_level,
+    models.Risk.status,
+    models.Risk.owner,
+    models.Risk.category_id,
+    models.Risk.version,
+    models.Risk.created_at,
+)
+
+def _reverse_order(order: schemas.SortOrder) -> schemas.SortOrder:
+    return schemas.SortOrder.ASC if order == schemas.SortOrder.DESC else schemas.SortOrder.DESC
+
+def get_risk_rows_window(db: Session, limit: int = 50, cursor: str = None, before: str = None,
+                         sort: schemas.RiskSortKey = schemas.RiskSortKey.CREATED_AT,
+                         order: schemas.SortOrder = schemas.SortOrder.DESC,
+                         filters=None):
+    """
+    Página de filas (RISK_ROW_COLUMNS) navegable en ambos sentidos para la
+    vista HTML. `cursor` avanza como en get_risks_page; `before` es un
+    cursor en el orden inverso que apunta al primer registro de la página
+    siguiente, y se recorre hacia atrás con el mismo índice.
+    Retorna (filas, sort, order, prev_cursor, next_cursor).
+    """
+    if before:
+        sort, backward, _, _ = decode_cursor(before)
+        rows, prev_cursor = get_risks_page(
+            db, limit=limit, cursor=before, filters=filters, columns=RISK_ROW_COLUMNS
+        )
+        rows.reverse()
+        order = _reverse_order(backward)
+        next_cursor = encode_cursor(rows[-1], sort, order) if rows else None
+        return rows, sort, order, prev_cursor, next_cursor
+
+    if cursor:
+        sort, order, _, _ = decode_cursor(cursor)
+    rows, next_cursor = get_risks_page(
+        db, limit=limit, cursor=cursor, sort=sort, order=order, filters=filters, columns=RISK_ROW_COLUMNS
+    )
+    prev_cursor = encode_cursor(rows[0], sort, _reverse_order(order)) if cursor and rows else None
+    return rows, sort, order, prev_cursor, next_cursor
+
+def get_risk(db: Session, risk_id: int):
+    """
+    Obtiene un riesgo específico por ID
+    """
+    return db.query(models.Risk).filter(models.Risk.id == risk_id).first()
+
+def _commit_detached(db: Session, instance):
+    """
+    Confirma la transacción sin expirar `instance`: los valores que trajo el
+    RETURNING siguen disponibles para la respuesta sin otro SELECT
+    """
+    db.flush()
+    db.expunge(instance)
+    db.commit()
+
+def _raise_if_stale(db: Session, risk_id: int, expected_version: Optional[int]):
+    """
+    Un UPDATE condicionado por versión que no afectó filas: si el riesgo
+    existe, la versión no coincidía (StaleDataError); si no, retorna
+    """
+    if expected_version is not None and get_risk_version(db, risk_id) is not None:
+        raise StaleDataError(f"Risk {risk_id} is not at version {expected_version}")
+
+def update_risk(db: Session, risk_id: int, risk_update: schemas.RiskUpdate,
+                expected_version: Optional[int] = None):
+    """
+    Actualiza un riesgo con un único UPDATE ... RETURNING. El nivel y la
+    plantilla se recalculan en SQL con el valor actual de la fila para el
+    campo que no cambia, así no hay lectura previa ni cambios perdidos entre
+    escrituras concurrentes. Con `expected_version` la fila solo se actualiza
+    si conserva esa versión (StaleDataError si cambió). Si ningún valor
+    cambia no se escribe: se retorna el riesgo tal cual, sin incrementar
+    versiones (los ETag siguen valiendo). Retorna None si el riesgo no existe.
+    """
+    update_data = risk_update.dict(exclude_unset=True)
+    if not update_data:
+        return _unchanged_risk(db, risk_id, expected_version)
+    version = bump_collection_version(db, RISKS_COLLECTION)
+    values = _risk_update_values(update_data)
+    values['change_seq'] = version
+
+    # Solo se escribe si algún campo enviado difiere del valor guardado
+    current = dict(update_data)
+    if current.get('status') is not None:
+        current['status'] = to_model_status(current['status'])
+    statement = update(models.Risk).where(
+        models.Risk.id == risk_id,
+        or_(*(getattr(models.Risk, field).is_distinct_from(value) for field, value in current.items()))
+    )
+    if expected_version is not None:
+        statement = statement.where(models.Risk.version == expected_version)
+    db_risk = db.execute(
+        statement.values(**values).returning(models.Risk),
+        execution_options={"synchronize_session": False}
+    ).scalar_one_or_none()
+    if db_risk is None:
+        # Sin fila: no existe, la versión no coincide o no había cambios
+        db.rollback()
+        return _unchanged_risk(db, risk_id, expected_version)
+
+    if ('probability' in update_data or 'impact' in update_data) \
+            and _score_cell(db_risk.probability, db_risk.impact) is None:
+        # Fuera de la escala no hay plantilla: el texto se calcula aquí
+        _set_risk_columns(db, db_risk, _template_values(db_risk.risk_level, db_risk.probability, db_risk.impact))
+    if HISTORY_FIELDS.intersection(update_data):
+        _record_history(db, db_risk)
+    _commit_detached(db, db_risk)
+    _publish_risk_event("updated", version, db_risk)
+    return db_risk
+
+def _unchanged_risk(db: Session, risk_id: int, expected_version: Optional[int]):
+    """Riesgo actual para una actualización sin cambios (None si no existe)"""
+    db_risk = get_risk(db, risk_id)
+    if db_risk is not None and expected_version is not None and db_risk.version != expected_version:
+        raise StaleDataError(f"Risk {risk_id} is not at version {expected_version}")
+    return db_risk
+
+def _set_risk_columns(db: Session, db_risk, values: dict):
+    """Cambia columnas de una fila ya actualizada en esta transacción, sin otra versión"""
+    db.execute(
+        update(models.Risk).where(models.Risk.id == db_risk.id).values(**values),
+        execution_options={"synchronize_session": False}
+    )
+    for field, value in values.items():
+        set_committed_value(db_risk, field, value)
+
+def _risk_level_case(score, thresholds: RiskThresholds):
+    """CASE SQL equivalente a _level_for_score sobre una expresión de puntaje"""
+    level_type = models.Risk.risk_level.type
+
+    def level(risk_level: schemas.RiskLevel):
+        return literal(models.RiskLevel(risk_level.value), level_type)
+
+    return case(
+        (score <= thresholds.low, level(schemas.RiskLevel.LOW)),
+        (score <= thresholds.medium, level(schemas.RiskLevel.MEDIUM)),
+        (score <= thresholds.high, level(schemas.RiskLevel.HIGH)),
+        else_=level(schemas.RiskLevel.CRITICAL)
+    )
+
+def _template_cases(probability, impact):
+    """
+    CASE SQL con la plantilla de la celda (p, i) según la tabla de puntuación
+    vigente, y el que descarta el texto propio de los riesgos que reciben
+    plantilla. Fuera de la escala se conservan los valores actuales.
+    """
+    template_ids = {
+        p * 10 + i: recommendation_templates.id_for(_score_cell(p, i).level.value, p, i)
+        for p in range(SCALE_MIN, SCALE_MAX + 1)
+        for i in range(SCALE_MIN, SCALE_MAX + 1)
+    }
+    key = probability * 10 + impact
+    return (
+        case(template_ids, value=key, else_=models.Risk.recommendation_template_id),
+        case((key.in_(list(template_ids)), null()), else_=models.Risk.custom_recommendations)
+    )
+
+def _risk_update_values(changes: dict) -> dict:
+    """
+    Valores del UPDATE para los cambios de schemas.RiskUpdate: estado del
+    modelo, nivel y plantilla recalculados en SQL si cambia la probabilidad
+    o el impacto, y la versión de la fila incrementada
+    """
+    values = dict(changes)
+    if values.get('status') is not None:
+        values['status'] = to_model_status(values['status'])
+
+    if values.get('probability') is not None and values.get('impact') is not None:
+        # Ambos valores conocidos: el resultado es el mismo para todas las filas
+        values['risk_level'] = calculate_risk_level(values['probability'], values['impact'])
+        values.update(_template_values(values['risk_level'], values['probability'], values['impact']))
+    elif 'probability' in values or 'impact' in values:
+        probability = values['probability'] if values.get('probability') is not None else models.Risk.probability
+        impact = values['impact'] if values.get('impact') is not None else models.Risk.impact
+        values['risk_level'] = _risk_level_case(probability * impact, get_scoring_thresholds())
+        values['recommendation_template_id'], values['custom_recommendations'] = _template_cases(probability, impact)
+    values['version'] = models.Risk.version + 1
+    return values
+
+def _apply_out_of_scale_templates(db: Session, rows):
+    """
+    Los CASE de _template_cases conservan la plantilla anterior fuera de la
+    escala; como en update_risk, esas filas reciben el texto calculado.
+    `rows` son filas de HISTORY_SNAPSHOT_COLUMNS ya actualizadas.
+    """
+    fallback = []
+    for row in rows:
+        if row.probability is None or row.impact is None or _score_cell(row.probability, row.impact) is not None:
+            continue
+        values = _template_values(row.risk_level, row.probability, row.impact)
+        fallback.append({
+            "b_id": row.risk_id,
+            "b_template_id": values["recommendation_template_id"],
+            "b_custom": values["custom_recommendations"],
+        })
+    if fallback:
+        risks = models.Risk.__table__
+        db.execute(
+            update(risks).where(risks.c.id == bindparam("b_id")).values(
+                recommendation_template_id=bindparam("b_template_id"),
+                recommendations=bindparam("b_custom")
+            ),
+            fallback
+        )
+
+def bulk_update_risks(db: Session, changes: schemas.RiskUpdate, ids=None, filters=None):
+    """
+    Aplica los mismos cambios a todos los riesgos seleccionados por `ids`
+    y/o `filters` con un único UPDATE ... WHERE ... RETURNING. Si cambian la
+    probabilidad o el impacto, el nivel y las recomendaciones se recalculan
+    en SQL con CASE sobre la tabla de puntuación vigente, usando el valor de
+    cada fila para el campo que no cambia. Retorna la lista de ids modificados.
+    """
+    values = _risk_update_values(changes.dict(exclude_unset=True))
+    # El contador se reserva antes del UPDATE para guardarlo en cada fila;
+    # si no se selecciona ninguna, el rollback lo descarta
+    version = bump_collection_version(db, RISKS_COLLECTION)
+    values['change_seq'] = version
+
+    statement = update(models.Risk).values(**values)
+    if ids is not None:
+        statement = statement.where(models.Risk.id.in_(ids))
+    statement = _apply_risk_filters(statement, filters)
+
+    record_history = bool(HISTORY_FIELDS.intersection(values))
+    returning = HISTORY_SNAPSHOT_COLUMNS if record_history else (models.Risk.id,)
+    rows = db.execute(
+        statement.returning(*returning),
+        execution_options={"synchronize_session": False}
+    ).all()
+
+    if not rows:
+        db.rollback()
+        return []
+    if 'probability' in values or 'impact' in values:
+        _apply_out_of_scale_templates(db, rows)
+    if record_history:
+        db.execute(insert(models.RiskHistory), [row._asdict() for row in rows])
+    db.commit()
+    _publish_bulk_event(version, len(rows))
+    return [row[0] for row in rows]
+
+# Recálculo de nivel y recomendaciones cuando cambia la política de puntuación
+RESCORE_JOB = "risks"
+RESCORE_CHUNK_SIZE = int(os.getenv("RISK_RESCORE_CHUNK_SIZE", "1000"))
+# Evita dos ejecuciones simultáneas dentro del mismo proceso
+rescore_lock = threading.Lock()
+
+def scoring_policy_fingerprint(table: ScoringTable = None) -> str:
+    """Identifica la política vigente: umbrales más un hash de niveles y recomendaciones"""
+    table = table or _scoring_table
+    digest = hashlib.sha256(repr([
+        (cell.level.value, cell.recommendations) for cell in table.cells
+    ]).encode("utf-8")).hexdigest()[:16]
+    low, medium, high = table.thresholds
+    return f"{low},{medium},{high}:{digest}"
+
+def get_rescore_checkpoint(db: Session) -> Optional[models.RescoreCheckpoint]:
+    return db.get(models.RescoreCheckpoint, RESCORE_JOB)
+
+def _start_rescore_checkpoint(db: Session, policy: str, restart: bool):
+    """
+    Retorna (checkpoint, reanudado). Una ejecución en curso o fallida con la
+    misma política se reanuda desde last_id; en otro caso se empieza desde cero.
+    """
+    checkpoint = get_rescore_checkpoint(db)
+    if checkpoint and checkpoint.status in ("running", "failed") and checkpoint.policy == policy and not restart:
+        checkpoint.status = "running"
+        checkpoint.error = None
+        db.commit()
+        return checkpoint, True
+    if checkpoint is None:
+        checkpoint = models.RescoreCheckpoint(name=RESCORE_JOB)
+        db.add(checkpoint)
+    checkpoint.policy = policy
+    checkpoint.status = "running"
+    checkpoint.last_id = 0
+    checkpoint.processed = 0
+    checkpoint.updated = 0
+    checkpoint.error = None
+    checkpoint.started_at = func.now()
+    db.commit()
+    return checkpoint, False
+
+def _fail_rescore_checkpoint(db: Session, error: Exception):
+    """Marca el checkpoint como fallido; los lotes ya confirmados se conservan"""
+    db.rollback()
+    checkpoint = get_rescore_checkpoint(db)
+    if checkpoint is not None:
+        checkpoint.status = "failed"
+        checkpoint.error = f"{type(error).__name__}: {error}"[:500]
+        db.commit()
+
+def _rescore_changes(rows, table: ScoringTable):
+    """
+    Filas del lote cuyo nivel o plantilla difieren de la tabla dada. El texto
+    propio (custom_recommendations) no se toca: lo escribió el usuario.
+    """
+    changes = []
+    for row in rows:
+        # Sin probabilidad o impacto, o fuera de la escala, no hay celda: se omite
+        if row.probability is None or row.impact is None:
+            continue
+        if not (SCALE_MIN <= row.probability <= SCALE_MAX and SCALE_MIN <= row.impact <= SCALE_MAX):
+            continue
+        cell = table.cells[_cell_index(row.probability, row.impact)]
+        level = models.RiskLevel(cell.level.value)
+        template_id = recommendation_templates.id_for(cell.level.value, row.probability, row.impact)
+        if level != row.risk_level or template_id != row.recommendation_template_id:
+            changes.append({
+                "b_id": row.id,
+                "b_level": level,
+                "b_template_id": template_id,
+                "level_changed": level != row.risk_level,
+            })
+    return changes
+
+def rescore_risks(db: Session, chunk_size: int = RESCORE_CHUNK_SIZE, restart: bool = False,
+                  max_chunks: Optional[int] = None, progress=None):
+    """
+    Recalcula risk_level y la plantilla de recomendaciones de toda la tabla
+    con la política vigente (el texto propio se conserva), en lotes ordenados por id (keyset). Cada lote es una transacción
+    corta que actualiza solo las filas que cambian y guarda el checkpoint,
+    de modo que el escritor se libera entre lotes y una ejecución
+    interrumpida se reanuda. `progress(report)` se llama tras cada lote.
+    Retorna un dict con el progreso total y las filas por segundo. Si un
+    lote falla, el checkpoint queda como 'failed' con el error y se relanza.
+    """
+    if recommendation_templates.fingerprint is None:
+        load_recommendation_templates(db)
+    table = _scoring_table
+    policy = scoring_policy_fingerprint(table)
+    checkpoint, resumed = _start_rescore_checkpoint(db, policy, restart)
+
+    risks = models.Risk.__table__
+    statement = update(risks).where(risks.c.id == bindparam("b_id")).values(
+        risk_level=bindparam("b_level", type_=risks.c.risk_level.type),
+        recommendation_template_id=bindparam("b_template_id"),
+        version=risks.c.version + 1,
+        change_seq=bindparam("b_change_seq")
+    )
+
+    started = time.perf_counter()
+    run_processed = 0
+    chunks = 0
+
+    def report():
+        elapsed = time.perf_counter() - started
+        return {
+            "status": checkpoint.status,
+            "policy": policy,
+            "resumed": resumed,
+            "last_id": checkpoint.last_id,
+            "processed": checkpoint.processed,
+            "updated": checkpoint.updated,
+            "run_processed": run_processed,
+            "run_seconds": round(elapsed, 3),
+            "rows_per_second": round(run_processed / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+    try:
+        while checkpoint.status == "running" and (max_chunks is None or chunks < max_chunks):
+            rows = db.execute(
+                select(risks.c.id, risks.c.probability, risks.c.impact, risks.c.risk_level,
+                       risks.c.recommendation_template_id)
+                .where(risks.c.id > checkpoint.last_id)
+                .order_by(risks.c.id)
+                .limit(chunk_size)
+            ).all()
+
+            changes = _rescore_changes(rows, table)
+            if changes:
+                version = bump_collection_version(db, RISKS_COLLECTION)
+                for change in changes:
+                    change["b_change_seq"] = version
+                db.execute(statement, changes)
+                changed_levels = [change["b_id"] for change in changes if change["level_changed"]]
+                if changed_levels:
+                    db.execute(insert(models.RiskHistory).from_select(
+                        ["risk_id", "probability", "impact", "risk_level", "status"],
+                        select(*HISTORY_SNAPSHOT_COLUMNS).where(models.Risk.id.in_(changed_levels))
+                    ))
+
+            if rows:
+                checkpoint.last_id = rows[-1].id
+            checkpoint.processed += len(rows)
+            checkpoint.updated += len(changes)
+            if len(rows) < chunk_size:
+                checkpoint.status = "completed"
+            db.commit()
+            if changes:
+                _publish_bulk_event(version, len(changes))
+
+            run_processed += len(rows)
+            chunks += 1
+            if progress:
+                progress(report())
+    except Exception as error:
+        _fail_rescore_checkpoint(db, error)
+        raise
+
+    return report()
+
+def delete_risk(db: Session, risk_id: int):
+    """
+    Elimina un riesgo existente y deja una marca (tombstone) con el
+    change_seq de la eliminación para GET /risks/changes
+    """
+    db_risk = db.query(models.Risk).filter(models.Risk.id == risk_id).first()
+    if db_risk:
+        db.delete(db_risk)
+        version = bump_collection_version(db, RISKS_COLLECTION)
+        # SQLite puede reutilizar el id del último riesgo: la marca se reemplaza
+        tombstone = sqlite_insert(models.RiskTombstone).values(risk_id=risk_id, change_seq=version)
+        db.execute(tombstone.on_conflict_do_update(
+            index_elements=[models.RiskTombstone.risk_id],
+            set_={"change_seq": version, "deleted_at": func.now()}
+        ))
+        db.commit()
+        _publish_risk_event("deleted", version, risk_id=risk_id)
+    return db_risk
+
+def update_risk_recommendations(db: Session, risk_id: int, custom_recommendations: str = None,
+                                expected_version: Optional[int] = None):
+    """
+    Actualiza las recomendaciones de un riesgo, opcionalmente con recomendaciones personalizadas.
+    Sin texto propio se vuelve a la plantilla de la celda (nivel, probabilidad,
+    impacto) de la fila, resuelta en el mismo UPDATE ... RETURNING.
+    """
+    version = bump_collection_version(db, RISKS_COLLECTION)
+    if custom_recommendations:
+        # Usar recomendaciones personalizadas
+        values = {"custom_recommendations": custom_recommendations}
+    else:
+        # Volver a las recomendaciones automáticas de la plantilla
+        templates = models.RecommendationTemplate
+        values = {
+            "recommendation_template_id": select(templates.id).where(
+                templates.risk_level == models.Risk.risk_level,
+                templates.probability == models.Risk.probability,
+                templates.impact == models.Risk.impact
+            ).scalar_subquery(),
+            "custom_recommendations": None,
+        }
+
+    statement = update(models.Risk).where(models.Risk.id == risk_id)
+    if expected_version is not None:
+        statement = statement.where(models.Risk.version == expected_version)
+    db_risk = db.execute(
+        statement.values(**values, version=models.Risk.version + 1, change_seq=version).returning(models.Risk),
+        execution_options={"synchronize_session": False}
+    ).scalar_one_or_none()
+    if db_risk is None:
+        db.rollback()
+        _raise_if_stale(db, risk_id, expected_version)
+        return None
+
+    if not custom_recommendations and db_risk.recommendation_template_id is None:
+        # Celda sin plantilla (fuera de la escala): texto calculado
+        _set_risk_columns(db, db_risk, _template_values(db_risk.risk_level, db_risk.probability, db_risk.impact))
+    _commit_detached(db, db_risk)
+    _publish_risk_event("updated", version, db_risk)
+    return db_risk
+
+def risk_to_dict(risk, category_names=None):
+    """Convierte un objeto Risk a diccionario para templates"""
+    return {
+        "id": risk.id,
+        "title": risk.title,
+        "description": risk.description,
+        "probability": risk.probability,
+        "impact": risk.impact,
+        "risk_level": risk.risk_level.value if risk.risk_level else "UNKNOWN",
+        "status": risk.status.value if risk.status else "UNKNOWN",
+        "owner": risk.owner,
+        "mitigation_plan": risk.mitigation_plan,
+        "recommendations": risk.recommendations,
+        "category_id": risk.category_id,
+        "category_name": (category_names or {}).get(risk.category_id),
+        "created_at": risk.created_at.strftime('%d/%m/%Y %H:%M') if risk.created_at else "N/A"
+    }
+
+# CRUD operations for RiskCategory
+def _category_snapshot(category) -> schemas.RiskCategory:
+    """Copia desacoplada de la sesión para guardar en la caché"""
+    return schemas.RiskCategory.model_validate(category, from_attributes=True)
+
+def load_category_cache(db: Session):
+    """
+    Carga todas las categorías en la caché del proceso junto con la versión
+    de la colección con la que se leyeron
+    """
+    version = get_collection_version(db, CATEGORIES_COLLECTION)
+    categories = db.query(models.RiskCategory).order_by(models.RiskCategory.id).all()
+    category_cache.replace(version, (_category_snapshot(category) for category in categories))
+
+def _fresh_category_cache(db: Session):
+    """
+    Devuelve la caché de categorías, comprobando como máximo una vez por
+    intervalo si otro proceso cambió la colección
+    """
+    if category_cache.needs_check():
+        if get_collection_version(db, CATEGORIES_COLLECTION) != category_cache.version:
+            load_category_cache(db)
+        category_cache.mark_checked()
+    return category_cache
+
+def create_category(db: Session, category: schemas.RiskCategoryCreate):
+    """
+    Crea una nueva categoría de riesgo
+    """
+    db_category = db.execute(
+        insert(models.RiskCategory).values(**category.dict()).returning(models.RiskCategory)
+    ).scalar_one()
+    version = bump_collection_version(db, CATEGORIES_COLLECTION)
+    _commit_detached(db, db_category)
+    category_cache.upsert(version, _category_snapshot(db_category))
+    return db_category
+
+def get_categories(db: Session, skip: int = 0, limit: int = 100):
+    """
+    Obtiene todas las categorías de riesgo desde la caché del proceso
+    """
+    return list(_fresh_category_cache(db).categories[skip:skip + limit])
+
+def get_category(db: Session, category_id: int):
+    """
+    Obtiene una categoría específica por ID desde la caché del proceso
+    """
+    return _fresh_category_cache(db).get(category_id)
+
+def get_category_names(db: Session):
+    """
+    Obtiene el mapa id → nombre de las categorías, para templates y serializadores
+    """
+    return _fresh_category_cache(db).names
+
+def update_category(db: Session, category_id: int, category_update: schemas.RiskCategoryCreate,
+                    expected_version: Optional[int] = None):
+    """
+    Actualiza una categoría existente con un único UPDATE ... RETURNING.
+    Las categorías no tienen versión por fila: `expected_version` se compara
+    con la versión de la colección (la del ETag de GET /categories/{id})
+    dentro del mismo UPDATE. Lanza StaleDataError si no coincide y retorna
+    None si la categoría no existe.
+    """
+    statement = update(models.RiskCategory).where(models.RiskCategory.id == category_id)
+    if expected_version is not None:
+        collection_version = select(models.CollectionVersion.version).where(
+            models.CollectionVersion.name == CATEGORIES_COLLECTION
+        ).scalar_subquery()
+        statement = statement.where(func.coalesce(collection_version, 0) == expected_version)
+    db_category = db.execute(
+        statement.values(**category_update.dict()).returning(models.RiskCategory),
+        execution_options={"synchronize_session": False}
+    ).scalar_one_or_none()
+    if db_category is None:
+        db.rollback()
+        if expected_version is not None and get_category(db, category_id) is not None:
+            raise StaleDataError(f"Category {category_id} changed since version {expected_version}")
+        return None
+
+    version = bump_collection_version(db, CATEGORIES_COLLECTION)
+    _commit_detached(db, db_category)
+    category_cache.upsert(version, _category_snapshot(db_category))
+    return db_category
+
+def delete_category(db: Session, category_id: int):
+    """
+    Elimina una categoría existente
+    """
+    db_category = db.query(models.RiskCategory).filter(models.RiskCategory.id == category_id).first()
+    if db_category:
+        version = bump_collection_version(db, CATEGORIES_COLLECTION)
+        # Los riesgos de la categoría quedan sin categoría asignada, con un
+        # único UPDATE en lugar de uno por riesgo desde la relación
+        risks_version = bump_collection_version(db, RISKS_COLLECTION)
+        db.execute(
+            update(models.Risk)
+            .where(models.Risk.category_id == category_id)
+            .values(category_id=None, version=models.Risk.version + 1, change_seq=risks_version),
+            execution_options={"synchronize_session": False}
+        )
+        db.delete(db_category)
+        db.commit()
+        category_cache.remove(version, category_id)
+        _publish_bulk_event(risks_version, 0)
+    return db_category
+
+# Matriz probabilidad × impacto desde los conteos de app.heatmap
+def _empty_matrix():
+    return [[0] * SCALE_MAX for _ in range(SCALE_MAX)]
+
+def get_risk_heatmap(db: Session, category_id: Optional[int] = None, status=None) -> dict:
+    """
+    Matriz 5x5 total, por categoría y por estado (formato schemas.RiskHeatmap),
+    leída de risk_heatmap_counts: a lo sumo 25 filas por categoría y estado.
+    Los riesgos fuera de la escala no entran en la matriz.
+    """
+    counts = models.RiskHeatmapCount
+    query = db.query(counts.category_id, counts.status, counts.probability, counts.impact, counts.risk_count).filter(
+        counts.risk_count > 0,
+        counts.probability.between(SCALE_MIN, SCALE_MAX),
+        counts.impact.between(SCALE_MIN, SCALE_MAX)
+    )
+    if category_id is not None:
+        query = query.filter(counts.category_id == category_id)
+    if status is not None:
+        query = query.filter(counts.status == to_model_status(status))
+
+    result = {"total": 0, "matrix": _empty_matrix()}
+    by_category = {}
+    by_status = {}
+    for cell_category, cell_status, probability, impact, count in query:
+        category_cell = by_category.setdefault(cell_category, {"total": 0, "matrix": _empty_matrix()})
+        status_cell = by_status.setdefault(cell_status, {"total": 0, "matrix": _empty_matrix()})
+        for target in (result, category_cell, status_cell):
+            target["total"] += count
+            target["matrix"][probability - 1][impact - 1] += count
+
+    category_names = get_category_names(db)
+    result["by_category"] = [
+        {
+            **cell,
+            "category_id": cell_category or None,
+            "category_name": category_names.get(cell_category),
+        }
+        for cell_category, cell in sorted(by_category.items())
+    ]
+    result["by_status"] = [
+        {**cell, "status": API_STATUS[cell_status]}
+        for cell_status, cell in sorted(by_status.items(), key=lambda item: item[0].value)
+    ]
+    return result
+
+# Funciones adicionales para análisis y reportes
+def _risk_summary_query(db: Session):
+    """
+    Consulta con las columnas de schemas.RiskSummary; el puntaje se calcula en
+    SQL y el nombre de la categoría se obtiene con un único JOIN
+    """
+    return db.query(
+        models.Risk.id,
+        models.Risk.title,
+        models.Risk.risk_level,
+        models.Risk.probability,
+        models.Risk.impact,
+        (models.Risk.probability * models.Risk.impact).label("score"),
+        models.Risk.owner,
+        models.Risk.status,
+        models.RiskCategory.name.label("category_name"),
+    ).outerjoin(models.RiskCategory, models.Risk.category_id == models.RiskCategory.id)
+
+def summary_row_to_dict(row):
+    """Convierte una fila de _risk_summary_query al formato de schemas.RiskSummary"""
+    return {
+        "id": row.id,
+        "title": row.title,
+        "risk_level": row.risk_level.value if row.risk_level else None,
+        "probability": row.probability,
+        "impact": row.impact,
+        "score": row.score,
+        "owner": row.owner,
+        "status": API_STATUS[row.status] if row.status else None,
+        "category_name": row.category_name,
+    }
+
+def get_risk_summaries(db: Session, skip: int = 0, limit: int = 100, filters=None):
+    """
+    Listado liviano de riesgos (schemas.RiskSummary): una sola consulta con
+    JOIN a la categoría que lee solo las columnas del resumen, sin cargar
+    descripción, plan de mitigación ni recomendaciones
+    """
+    query = _apply_risk_filters(_risk_summary_query(db), filters)
+    rows = query.order_by(models.Risk.id).offset(skip).limit(limit).all()
+    return [summary_row_to_dict(row) for row in rows]
+
+def _count_risks_by_status_and_level(db: Session):
+    """
+    Cuenta los riesgos agrupados por (estado, nivel) en una sola pasada
+    sobre la tabla. Retorna una lista de tuplas (estado, nivel, conteo).
+    """
+    return db.query(
+        models.Risk.status,
+        models.Risk.risk_level,
+        func.count(models.Risk.id)
+    ).group_by(models.Risk.status, models.Risk.risk_level).all()
+
+def get_risk_stats(db: Session):
+    """
+    Obtiene estadísticas generales de riesgos con una única consulta agrupada
+    """
+    by_status = {status: 0 for status in schemas.RiskStatus}
+    by_level = {level.value: 0 for level in schemas.RiskLevel}
+    total = 0
+    for status, level, count in _count_risks_by_status_and_level(db):
+        total += count
+        if status is not None:
+            by_status[API_STATUS[status]] += count
+        if level is not None:
+            by_level[level.value] += count
+
+    return {
+        "total": total,
+        "open": by_status[schemas.RiskStatus.OPEN],
+        "in_progress": by_status[schemas.RiskStatus.IN_PROGRESS],
+        "closed": by_status[schemas.RiskStatus.CLOSED],
+        "mitigated": by_status[schemas.RiskStatus.MITIGATED],
+        "by_level": by_level
+    }
+
+def get_risks_by_level(db: Session):
+    """
+    Obtiene conteo de riesgos por nivel
+    """
+    return db.query(
+        models.Risk.risk_level,
+        func.count(models.Risk.id)
+    ).group_by(models.Risk.risk_level).all()
+
+def get_dashboard_summary(db: Session, recent_limit: int = 5):
+    """
+    Construye el resumen del dashboard: conteos y porcentajes por nivel salen
+    de la consulta agrupada y los riesgos recientes del índice por created_at
+    """
+    stats = get_risk_stats(db)
+    total = stats["total"]
+
+    risks_by_level = [
+        {
+            "level": level,
+            "count": count,
+            "percentage": round(count * 100 / total, 2) if total else 0.0
+        }
+        for level, count in stats["by_level"].items()
+    ]
+
+    recent = (
+        _risk_summary_query(db)
+        .order_by(models.Risk.created_at.desc(), models.Risk.id.desc())
+        .limit(recent_limit)
+        .all()
+    )
+
+    return {
+        "total_risks": total,
+        "risks_by_level": risks_by_level,
+        "critical_risks_count": stats["by_level"][schemas.RiskLevel.CRITICAL.value],
+        "high_risks_count": stats["by_level"][schemas.RiskLevel.HIGH.value],
+        "recent_risks": [summary_row_to_dict(row) for row in recent]
+    }
@@ -1,25 +1,206 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-
-SQLALCHEMY_DATABASE_URL = "sqlite:///./risk_management.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-Base = declarative_base()
-
-# Importar los modelos DESPUÉS de definir Base
-# Esto asegura que SQLAlchemy los registre correctamente
-from app.models import RiskCategory, Risk
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+import os
+import time
+
+import anyio
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from app import metrics, profiler
+
+SQLALCHEMY_DATABASE_URL = os.getenv("RISK_DB_URL", "sqlite:///./risk_management.db")
+
+# Perfil de ajuste de SQLite; cada PRAGMA se puede sobrescribir por entorno
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("RISK_DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("RISK_DB_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("RISK_DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("RISK_DB_CACHE_SIZE", "-65536")),  # Negativo: KiB
+    "busy_timeout": int(os.getenv("RISK_DB_BUSY_TIMEOUT", "5000")),  # Milisegundos
+    "foreign_keys": "ON",
+}
+# Conexiones del pool de solo lectura usado por las rutas GET
+READ_POOL_SIZE = int(os.getenv("RISK_DB_READ_POOL_SIZE", "8"))
+# Segundos que una escritura espera al escritor único antes de fallar
+WRITE_POOL_TIMEOUT = float(os.getenv("RISK_DB_WRITE_TIMEOUT", "30"))
+
+def _apply_pragmas(dbapi_connection, readonly: bool = False):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        # El modo de journal es persistente y solo lo fija el escritor
+        if readonly and name == "journal_mode":
+            continue
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout por una conexión libre"""
+    metrics_label = "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_pool_wait(self.metrics_label, time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_label = self.metrics_label
+        return pool
+
+def _instrument(engine, label: str):
+    metrics.instrument_engine(engine, label)
+    if profiler.ENABLED:
+        profiler.instrument_engine(engine, label)
+
+def _is_memory_database(url) -> bool:
+    return url.database in (None, "", ":memory:")
+
+def create_engines(database_url: str):
+    """
+    Crea el motor de escritura y el de solo lectura para una URL de SQLite.
+    El escritor usa una única conexión, de modo que las escrituras se
+    serializan en el pool en lugar de chocar con "database is locked".
+    Los lectores abren la base con mode=ro y, gracias a WAL, no esperan al
+    escritor. Para bases en memoria ambos motores son el mismo.
+    """
+    url = make_url(database_url)
+    connect_args = {"check_same_thread": False}
+
+    if _is_memory_database(url):
+        writer = create_engine(database_url, connect_args=connect_args, poolclass=StaticPool)
+        event.listen(writer, "connect", lambda conn, record: _apply_pragmas(conn))
+        _instrument(writer, "writer")
+        return writer, writer
+
+    writer = create_engine(
+        database_url,
+        connect_args=connect_args,
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=WRITE_POOL_TIMEOUT
+    )
+    reader = create_engine(
+        url.set(database=f"file:{url.database}", query={**url.query, "mode": "ro", "uri": "true"}),
+        connect_args=connect_args,
+        poolclass=TimedQueuePool,
+        pool_size=READ_POOL_SIZE,
+        max_overflow=READ_POOL_SIZE
+    )
+    event.listen(writer, "connect", lambda conn, record: _apply_pragmas(conn))
+    event.listen(reader, "connect", lambda conn, record: _apply_pragmas(conn, readonly=True))
+    for engine, label in ((writer, "writer"), (reader, "reader")):
+        engine.pool.metrics_label = label
+        _instrument(engine, label)
+    return writer, reader
+
+engine, read_engine = create_engines(SQLALCHEMY_DATABASE_URL)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+Base = declarative_base()
+
+# Importar los modelos DESPUÉS de definir Base
+# Esto asegura que SQLAlchemy los registre correctamente
+from app.models import RiskCategory, Risk, RecommendationTemplate, CollectionVersion, RiskHistory, RescoreCheckpoint, RiskTombstone, RiskHeatmapCount
+from app import heatmap, search
+
+def _add_missing_columns(connection):
+    """
+    Agrega con ALTER TABLE las columnas de los modelos que no existen en
+    tablas creadas con una versión anterior (create_all no altera tablas).
+    """
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+def _backfill_created_at(connection):
+    """
+    Los riesgos anteriores a la columna created_at la tienen en NULL y la
+    paginación por cursor ((created_at, id) > ...) no los alcanza. Reciben la
+    fecha del riesgo más antiguo, así quedan al principio del orden por fecha.
+    """
+    connection.execute(text(
+        "UPDATE risks SET created_at = "
+        "coalesce((SELECT min(created_at) FROM risks), CURRENT_TIMESTAMP) "
+        "WHERE created_at IS NULL"
+    ))
+
+def init_db():
+    """
+    Crea las tablas faltantes, agrega columnas nuevas y crea los índices
+    agregados después de crear la base de datos (create_all solo crea
+    índices junto con su tabla).
+    """
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        _add_missing_columns(connection)
+        _backfill_created_at(connection)
+    with engine.begin() as connection:
+        # La reflexión de SQLAlchemy omite los índices sobre expresiones, así
+        # que checkfirst no los ve: se comparan los nombres en sqlite_master
+        existing = set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=connection)
+    with engine.begin() as connection:
+        search.ensure_fts(connection)
+        heatmap.ensure_heatmap(connection)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_read_db():
+    """Sesión sobre el pool de solo lectura, para rutas que no escriben"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Hilos reservados para el trabajo de base de datos de las rutas async.
+# Acotar el pool evita abrir más conexiones SQLite de las que el disco atiende.
+DB_THREADPOOL_SIZE = int(os.getenv("RISK_DB_THREADS", "8"))
+_db_limiter = None
+
+def _get_db_limiter():
+    # CapacityLimiter necesita un event loop activo, por eso se crea al primer uso
+    global _db_limiter
+    if _db_limiter is None:
+        _db_limiter = anyio.CapacityLimiter(DB_THREADPOOL_SIZE)
+    return _db_limiter
+
+async def _run_in_session(session_factory, func, args, kwargs):
+    def call():
+        db = session_factory()
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.close()
+    return await anyio.to_thread.run_sync(call, limiter=_get_db_limiter())
+
+async def run_db(func, *args, **kwargs):
+    """
+    Ejecuta func(db, *args, **kwargs) en el pool de hilos acotado con una
+    sesión propia, para que las rutas async no bloqueen el event loop.
+    """
+    return await _run_in_session(SessionLocal, func, args, kwargs)
+
+async def run_read_db(func, *args, **kwargs):
+    """Igual que run_db, pero con una sesión del pool de solo lectura"""
+    return await _run_in_session(ReadSessionLocal, func, args, kwargs)
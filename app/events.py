@@ -0,0 +1,92 @@
+"""
+Difusión en el proceso de los cambios de riesgos hacia los clientes SSE.
+
+crud publica un evento después de cada commit; cada suscriptor (una conexión
+a GET /risks/events) tiene su propia cola acotada en su event loop. publish()
+solo agenda la entrega con call_soon_threadsafe, así que nunca bloquea al
+escritor. Si un cliente lento llena su cola, sus eventos pendientes se
+descartan y recibe un único "resync" para que recargue la lista.
+
+La difusión es local al proceso: con varios workers cada uno notifica solo
+las escrituras que atendió.
+"""
+import asyncio
+import json
+import os
+import threading
+from typing import Optional
+
+QUEUE_SIZE = int(os.getenv("RISK_EVENTS_QUEUE", "100"))
+# Segundos sin eventos tras los que se envía un comentario de keep-alive
+HEARTBEAT_INTERVAL = float(os.getenv("RISK_EVENTS_HEARTBEAT", "15"))
+
+RESYNC = {"type": "resync"}
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _offer(self, event: dict):
+        # Corre en el event loop del suscriptor
+        if self.queue.full():
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Siguiente evento, o None si pasó `timeout` sin eventos"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: dict):
+        """Entrega el evento a todos los suscriptores sin esperar a ninguno"""
+        with self._lock:
+            subscribers = tuple(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._offer, event)
+            except RuntimeError:
+                # El event loop del suscriptor ya se cerró
+                self.unsubscribe(subscriber)
+
+
+def format_sse(event: dict) -> str:
+    """Serializa un evento en el formato text/event-stream"""
+    lines = []
+    if event.get("version") is not None:
+        lines.append(f"id: {event['version']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+risk_events = EventHub()
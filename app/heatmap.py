@@ -0,0 +1,86 @@
+"""
+Conteos de la matriz probabilidad × impacto por categoría y estado.
+
+La tabla risk_heatmap_counts (models.RiskHeatmapCount) se mantiene con
+triggers sobre risks, igual que el índice FTS: cualquier escritura (ORM,
+importación masiva, UPDATE masivo o SQL directo) ajusta la celda afectada.
+Leer la matriz cuesta como máximo 25 filas por categoría y estado, sin
+importar cuántos riesgos haya.
+"""
+from sqlalchemy import text
+
+HEATMAP_TABLE = "risk_heatmap_counts"
+_KEY_COLUMNS = "category_id, status, probability, impact"
+
+
+def _key_values(row: str) -> str:
+    # Los NULL se agrupan en valores fijos para que la clave primaria sea válida
+    # (el estado por defecto del modelo es OPEN)
+    return (
+        f"coalesce({row}.category_id, 0), coalesce({row}.status, 'OPEN'), "
+        f"coalesce({row}.probability, 0), coalesce({row}.impact, 0)"
+    )
+
+
+def _increment(row: str) -> str:
+    return (
+        f"INSERT INTO {HEATMAP_TABLE} ({_KEY_COLUMNS}, risk_count) VALUES ({_key_values(row)}, 1) "
+        f"ON CONFLICT ({_KEY_COLUMNS}) DO UPDATE SET risk_count = risk_count + 1;"
+    )
+
+
+def _decrement(row: str) -> str:
+    return (
+        f"UPDATE {HEATMAP_TABLE} SET risk_count = risk_count - 1 "
+        f"WHERE ({_KEY_COLUMNS}) = ({_key_values(row)});"
+    )
+
+
+HEATMAP_TRIGGERS = ("risks_heatmap_ai", "risks_heatmap_ad", "risks_heatmap_au")
+
+HEATMAP_TRIGGERS_DDL = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS risks_heatmap_ai AFTER INSERT ON risks BEGIN
+        {_increment("new")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS risks_heatmap_ad AFTER DELETE ON risks BEGIN
+        {_decrement("old")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS risks_heatmap_au AFTER UPDATE OF {_KEY_COLUMNS} ON risks
+    WHEN old.category_id IS NOT new.category_id OR old.status IS NOT new.status
+      OR old.probability IS NOT new.probability OR old.impact IS NOT new.impact
+    BEGIN
+        {_decrement("old")}
+        {_increment("new")}
+    END
+    """,
+)
+
+
+def ensure_heatmap(connection):
+    """
+    Crea los triggers si no existen. Si faltaban, los conteos no reflejan
+    las escrituras anteriores y se reconstruyen desde risks.
+    """
+    names = ", ".join(f"'{name}'" for name in HEATMAP_TRIGGERS)
+    existing = connection.execute(text(
+        f"SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN ({names})"
+    )).scalar()
+    for ddl in HEATMAP_TRIGGERS_DDL:
+        connection.execute(text(ddl))
+    if existing < len(HEATMAP_TRIGGERS):
+        rebuild_heatmap(connection)
+
+
+def rebuild_heatmap(connection) -> int:
+    """Recalcula todos los conteos con un GROUP BY sobre risks; retorna las celdas"""
+    connection.execute(text(f"DELETE FROM {HEATMAP_TABLE}"))
+    result = connection.execute(text(
+        f"INSERT INTO {HEATMAP_TABLE} ({_KEY_COLUMNS}, risk_count) "
+        f"SELECT {_key_values('risks')}, count(*) FROM risks GROUP BY 1, 2, 3, 4"
+    ))
+    return result.rowcount
@@ -0,0 +1,54 @@
+"""
+Utilidades para caché HTTP condicional (ETag / If-None-Match) y escrituras
+condicionales (If-Match).
+Los ETag se derivan de versiones que crud mantiene en cada escritura, por lo
+que comprobar si algo cambió cuesta una lectura por clave primaria y no
+requiere cargar ni serializar los datos.
+"""
+from fastapi import Request, Response
+
+def make_etag(*parts) -> str:
+    """ETag fuerte construido con las partes que identifican la versión"""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Compara If-None-Match con el ETag actual (comparación débil, RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def etag_headers(etag: str) -> dict:
+    # Los clientes pueden guardar la respuesta pero deben revalidarla
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+def set_etag(response: Response, etag: str):
+    response.headers.update(etag_headers(etag))
+
+# Versión que ninguna fila tiene: un If-Match que no corresponde al recurso
+# hace que el UPDATE condicionado no afecte filas y responda 409
+NO_MATCHING_VERSION = -1
+
+def if_match_version(request: Request, *parts):
+    """
+    Versión esperada según If-Match para un ETag make_etag(*parts, version).
+    Retorna None sin encabezado o con "*" (cualquier versión sirve) y
+    NO_MATCHING_VERSION si ningún ETag corresponde. Usa comparación fuerte:
+    un ETag débil nunca coincide (RFC 9110).
+    """
+    header = request.headers.get("if-match")
+    if not header or header.strip() == "*":
+        return None
+    prefix = make_etag(*parts)[:-1] + "-"
+    for tag in (tag.strip() for tag in header.split(",")):
+        if tag.startswith(prefix) and tag.endswith('"'):
+            version = tag[len(prefix):-1]
+            if version.isdigit():
+                return int(version)
+    return NO_MATCHING_VERSION
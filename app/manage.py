@@ -0,0 +1,102 @@
+"""
+Comandos de mantenimiento de la base de datos.
+
+Uso: python -m app.manage <comando>
+"""
+import argparse
+import sys
+
+from sqlalchemy import text
+
+from app.database import SessionLocal, engine, init_db
+from app import crud, heatmap, search
+
+
+def rebuild_fts(args):
+    with engine.begin() as connection:
+        search.ensure_fts(connection)
+        search.rebuild_fts(connection)
+    print("✅ Índice de búsqueda reconstruido")
+
+
+def rebuild_heatmap(args):
+    with engine.begin() as connection:
+        heatmap.ensure_heatmap(connection)
+        cells = heatmap.rebuild_heatmap(connection)
+    print(f"✅ Matriz de riesgos reconstruida ({cells} celdas)")
+
+
+def check_plans(args):
+    db = SessionLocal()
+    try:
+        results = crud.check_risk_query_plans(db)
+    finally:
+        db.close()
+    for name, plan, error in results:
+        print(f"{'❌' if error else '✅'} {name}: {'; '.join(plan)}" + (f" ({error})" if error else ""))
+    if any(error for _, _, error in results):
+        sys.exit(1)
+
+
+def rescore(args):
+    def progress(report):
+        print(f"  ... id {report['last_id']}: {report['processed']} procesados, "
+              f"{report['updated']} actualizados ({report['rows_per_second']} filas/s)")
+
+    db = SessionLocal()
+    try:
+        with crud.rescore_lock:
+            report = crud.rescore_risks(db, chunk_size=args.chunk_size, restart=args.restart, progress=progress)
+    finally:
+        db.close()
+    if report["resumed"]:
+        print("↻ Ejecución anterior reanudada")
+    print(f"✅ Recálculo {report['status']}: {report['processed']} riesgos procesados, "
+          f"{report['updated']} actualizados, {report['rows_per_second']} filas/s")
+
+
+def dedupe_recommendations(args):
+    db = SessionLocal()
+    try:
+        migrated = crud.dedupe_recommendations(db)
+    finally:
+        db.close()
+    print(f"✅ Recomendaciones de {migrated} riesgos migradas a plantillas")
+    if args.vacuum:
+        # VACUUM no puede correr dentro de una transacción
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM"))
+        print("✅ Base de datos compactada")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("rebuild-fts", help="Reconstruye el índice FTS5 de búsqueda de riesgos").set_defaults(func=rebuild_fts)
+
+    commands.add_parser("rebuild-heatmap", help="Recalcula los conteos de la matriz probabilidad × impacto").set_defaults(func=rebuild_heatmap)
+
+    commands.add_parser("check-plans", help="Falla si algún filtro de GET /risks/ no usa un índice").set_defaults(func=check_plans)
+
+    rescore_parser = commands.add_parser("rescore", help="Recalcula nivel y recomendaciones con la política vigente")
+    rescore_parser.add_argument("--chunk-size", type=int, default=crud.RESCORE_CHUNK_SIZE, help="Riesgos por transacción")
+    rescore_parser.add_argument("--restart", action="store_true", help="Ignora el checkpoint y empieza desde el primer riesgo")
+    rescore_parser.set_defaults(func=rescore)
+
+    dedupe_parser = commands.add_parser("dedupe-recommendations", help="Reemplaza el texto repetido de recomendaciones por plantillas")
+    dedupe_parser.add_argument("--vacuum", action="store_true", help="Compacta el archivo de la base después de migrar")
+    dedupe_parser.set_defaults(func=dedupe_recommendations)
+
+    args = parser.parse_args(argv)
+    init_db()
+    db = SessionLocal()
+    try:
+        crud.load_recommendation_templates(db)
+    finally:
+        db.close()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
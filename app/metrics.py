@@ -0,0 +1,252 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus.
+
+Sin dependencias externas: contadores, gauges e histogramas con etiquetas
+que se actualizan con un lock corto en el camino caliente y se serializan
+solo cuando se consulta /metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+
+# Buckets en segundos: peticiones HTTP y sentencias SQL
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+# Starlette agrega "; charset=utf-8" a los tipos text/*
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def replace(self, values: dict):
+        """Sustituye todas las series (para gauges calculados al consultar)"""
+        with self._lock:
+            self._values = dict(values)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        # Se guarda el conteo por bucket (no acumulado) para que observar sea O(log n)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            snapshot = {labels: (counts[:], total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket = _format_labels(self.labelnames, labels, f'le="{_format_number(float(bound))}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "risk_http_request_duration_seconds", "Duración de las peticiones HTTP por ruta y estado",
+    ("method", "route", "status"), REQUEST_BUCKETS
+))
+http_requests_in_progress = registry.register(Gauge(
+    "risk_http_requests_in_progress", "Peticiones HTTP en curso", ("method",)
+))
+sql_statement_duration = registry.register(Histogram(
+    "risk_db_statement_duration_seconds", "Duración de las sentencias SQL por motor y operación",
+    ("engine", "operation"), SQL_BUCKETS
+))
+sql_statement_errors = registry.register(Counter(
+    "risk_db_statement_errors_total", "Sentencias SQL que terminaron con error", ("engine",)
+))
+pool_checkout_wait = registry.register(Histogram(
+    "risk_db_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool",
+    ("engine",), SQL_BUCKETS
+))
+pool_checkout_wait_last = registry.register(Gauge(
+    "risk_db_pool_checkout_wait_last_seconds", "Espera de la última obtención de conexión del pool", ("engine",)
+))
+pool_checked_out = registry.register(Gauge(
+    "risk_db_pool_checked_out", "Conexiones del pool en uso", ("engine",)
+))
+risks_by_status_level = registry.register(Gauge(
+    "risk_risks", "Riesgos por estado y nivel", ("status", "level")
+))
+
+
+# Instrumentación de SQLAlchemy
+def _operation(statement: str) -> str:
+    head = statement.lstrip()[:16].split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def instrument_engine(engine, label: str):
+    """
+    Mide cada sentencia con los eventos before/after_cursor_execute. El inicio
+    se apila en conn.info porque una conexión ejecuta sentencias de a una.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        sql_statement_duration.observe(time.perf_counter() - started, label, _operation(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        connection = context.connection
+        if connection is not None and connection.info.get("metrics_started"):
+            connection.info["metrics_started"].pop()
+        sql_statement_errors.inc(label)
+
+
+def observe_pool_wait(label: str, seconds: float):
+    pool_checkout_wait.observe(seconds, label)
+    pool_checkout_wait_last.set(label, value=seconds)
+
+
+def collect_pool_usage(engines: dict):
+    """Actualiza las conexiones en uso de cada pool (se llama al consultar /metrics)"""
+    pool_checked_out.replace({
+        (label, ): engine.pool.checkedout()
+        for label, engine in engines.items()
+        if hasattr(engine.pool, "checkedout")
+    })
+
+
+def collect_risk_counts(counts: dict):
+    """Actualiza los riesgos por (estado, nivel) con un dict {(estado, nivel): conteo}"""
+    risks_by_status_level.replace(counts)
+
+
+# Middleware ASGI
+class MetricsMiddleware:
+    """
+    Mide la latencia de cada petición HTTP. La ruta se etiqueta con la
+    plantilla (/risks/{risk_id}) que FastAPI deja en el scope al enrutar,
+    así la cardinalidad no crece con los ids; los estáticos y las rutas
+    inexistentes se agrupan como "other".
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_progress.dec(method)
+            route = scope.get("route")
+            http_request_duration.observe(
+                elapsed, method, getattr(route, "path", "other"), status
+            )
@@ -1,48 +1,206 @@
-from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey
-from sqlalchemy.orm import relationship
-from app.database import Base  # Importar Base desde database.py
-import enum
-from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey, DateTime
-from sqlalchemy.sql import func
-import enum
-
-
-class RiskLevel(enum.Enum):
-    LOW = "LOW"
-    MEDIUM = "MEDIUM"
-    HIGH = "HIGH"
-    CRITICAL = "CRITICAL"
-
-class RiskStatus(enum.Enum):
-    OPEN = "OPEN"         # Cambiado de "abierto" a "OPEN"
-    ENPROGRESS = "IN-PROGRESS"  #Cambiado de "inprogress" a "IN-PROGRESS"
-    CIERRA = "CLOSED"      #Cambiado de "cerrado" a "CLOSED"
-    MITIGATED = "MITIGATED"    #Cambiado de "mitigado" un "MITIGATED"
-
-class RiskCategory(Base):
-    __tablename__ = "risk_categories"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), unique=True, index=True)
-    description = Column(String(500))
-    
-    risks = relationship("Risk", back_populates="category")
-
-class Risk(Base):
-    __tablename__ = "risks"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String(200), index=True)
-    description = Column(String(1000))
-    probability = Column(Integer)  # 1-5 scale
-    impact = Column(Integer)       # 1-5 scale
-    risk_level = Column(Enum(RiskLevel))
-    status = Column(Enum(RiskStatus), default=RiskStatus.OPEN)
-    owner = Column(String(100))
-    mitigation_plan = Column(String(1000))
-    recommendations = Column(String(1000))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())  # ← NUEVO CAMPO
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())        # ← OPCIONAL
-    
-    category_id = Column(Integer, ForeignKey("risk_categories.id"))
-    category = relationship("RiskCategory", back_populates="risks")
\ No newline at end of file
+from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey
+from sqlalchemy.orm import relationship
+from app.database import Base  # Importar Base desde database.py
+import enum
+from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey, DateTime, Index, case, literal_column, select
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.sql import func
+from app.recommendation_cache import recommendation_templates
+import enum
+
+
+class RiskLevel(enum.Enum):
+    LOW = "LOW"
+    MEDIUM = "MEDIUM"
+    HIGH = "HIGH"
+    CRITICAL = "CRITICAL"
+
+# Severidad de cada nivel para ordenar por gravedad y no alfabéticamente
+RISK_LEVEL_RANKS = {RiskLevel.LOW: 1, RiskLevel.MEDIUM: 2, RiskLevel.HIGH: 3, RiskLevel.CRITICAL: 4}
+
+def risk_level_rank(column):
+    """
+    Expresión SQL con la severidad de risk_level (0 si es NULL). Los valores
+    van como literales para que coincida con el índice sobre la expresión.
+    """
+    return case(
+        *((column == literal_column(f"'{level.name}'"), literal_column(str(rank)))
+          for level, rank in RISK_LEVEL_RANKS.items()),
+        else_=literal_column("0")
+    )
+
+class RiskStatus(enum.Enum):
+    OPEN = "OPEN"         # Cambiado de "abierto" a "OPEN"
+    ENPROGRESS = "IN-PROGRESS"  #Cambiado de "inprogress" a "IN-PROGRESS"
+    CIERRA = "CLOSED"      #Cambiado de "cerrado" a "CLOSED"
+    MITIGATED = "MITIGATED"    #Cambiado de "mitigado" un "MITIGATED"
+
+class RiskCategory(Base):
+    __tablename__ = "risk_categories"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, index=True)
+    description = Column(String(500))
+    
+    risks = relationship("Risk", back_populates="category")
+
+class RecommendationTemplate(Base):
+    """
+    Texto de recomendaciones automáticas para una celda (nivel, probabilidad,
+    impacto). Hay a lo sumo 4 x 25 plantillas compartidas por todos los riesgos.
+    """
+    __tablename__ = "recommendation_templates"
+
+    id = Column(Integer, primary_key=True)
+    risk_level = Column(Enum(RiskLevel), nullable=False)
+    probability = Column(Integer, nullable=False)
+    impact = Column(Integer, nullable=False)
+    text = Column(String(1000), nullable=False)
+
+    __table_args__ = (
+        Index("ux_recommendation_templates_cell", "risk_level", "probability", "impact", unique=True),
+    )
+
+class Risk(Base):
+    __tablename__ = "risks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String(200), index=True)
+    description = Column(String(1000))
+    probability = Column(Integer)  # 1-5 scale
+    impact = Column(Integer)       # 1-5 scale
+    risk_level = Column(Enum(RiskLevel))  # Indexado por ix_risks_risk_level_id
+    status = Column(Enum(RiskStatus), default=RiskStatus.OPEN, index=True)
+    owner = Column(String(100))
+    mitigation_plan = Column(String(1000))
+    # Las recomendaciones automáticas se referencian por plantilla; la
+    # columna "recommendations" solo guarda texto personalizado
+    custom_recommendations = Column("recommendations", String(1000))
+    recommendation_template_id = Column(Integer, ForeignKey("recommendation_templates.id"), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())  # ← NUEVO CAMPO
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())        # ← OPCIONAL
+    
+    # Versión de la fila; SQLAlchemy la incrementa en cada UPDATE y se usa
+    # para los ETag de las lecturas
+    version = Column(Integer, nullable=False, server_default="1")
+    # Valor del contador de la colección "risks" en la última escritura de
+    # la fila; GET /risks/changes lee en orden de este índice
+    change_seq = Column(Integer, nullable=False, server_default="0")
+
+    category_id = Column(Integer, ForeignKey("risk_categories.id"), index=True)
+    category = relationship("RiskCategory", back_populates="risks")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    @hybrid_property
+    def recommendations(self):
+        """Texto personalizado o, si no hay, el de la plantilla (desde la caché en memoria)"""
+        if self.custom_recommendations is not None:
+            return self.custom_recommendations
+        return recommendation_templates.text(self.recommendation_template_id)
+
+    @recommendations.setter
+    def recommendations(self, value):
+        self.custom_recommendations = value
+
+    @recommendations.expression
+    def recommendations(cls):
+        return func.coalesce(
+            cls.custom_recommendations,
+            select(RecommendationTemplate.text)
+            .where(RecommendationTemplate.id == cls.recommendation_template_id)
+            .scalar_subquery()
+        )
+
+    __table_args__ = (
+        # Índices para la paginación por cursor (keyset) en GET /risks/
+        Index("ix_risks_created_at_id", "created_at", "id"),
+        Index("ix_risks_risk_level_id", "risk_level", "id"),
+        # Orden por severidad (sort=risk_level) sobre la expresión, no el nombre
+        Index("ix_risks_risk_level_rank_id", risk_level_rank(risk_level), "id"),
+        # Índice compuesto para los filtros por rango de probabilidad/impacto
+        Index("ix_risks_probability_impact", "probability", "impact"),
+        # Cuando solo se filtra por impacto el índice anterior no sirve
+        Index("ix_risks_impact", "impact"),
+        # Sincronización incremental por (change_seq, id)
+        Index("ix_risks_change_seq_id", "change_seq", "id"),
+    )
+
+class CollectionVersion(Base):
+    """
+    Contador de cambios por colección ("risks", "categories"). Las escrituras
+    de crud lo incrementan en la misma transacción, así todos los workers ven
+    el mismo valor y pueden responder 304 sin volver a consultar los datos.
+    """
+    __tablename__ = "collection_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class RiskHeatmapCount(Base):
+    """
+    Cantidad de riesgos por (categoría, estado, probabilidad, impacto). La
+    mantienen los triggers de app.heatmap en cada INSERT/UPDATE/DELETE de
+    risks; category_id 0 agrupa los riesgos sin categoría.
+    """
+    __tablename__ = "risk_heatmap_counts"
+
+    category_id = Column(Integer, primary_key=True)
+    status = Column(Enum(RiskStatus), primary_key=True)
+    probability = Column(Integer, primary_key=True)
+    impact = Column(Integer, primary_key=True)
+    risk_count = Column(Integer, nullable=False, default=0)
+
+
+class RiskTombstone(Base):
+    """
+    Marca de un riesgo eliminado con el change_seq de la eliminación, para
+    que GET /risks/changes informe las bajas a los clientes sincronizados.
+    """
+    __tablename__ = "risk_tombstones"
+
+    risk_id = Column(Integer, primary_key=True)
+    change_seq = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RiskHistory(Base):
+    """
+    Historial de solo inserción con una instantánea compacta de cada cambio de
+    probabilidad, impacto, nivel o estado de un riesgo. No tiene clave foránea
+    para conservar el historial aunque el riesgo se elimine.
+    """
+    __tablename__ = "risk_history"
+
+    id = Column(Integer, primary_key=True)
+    risk_id = Column(Integer, nullable=False)
+    probability = Column(Integer)
+    impact = Column(Integer)
+    risk_level = Column(Enum(RiskLevel))
+    status = Column(Enum(RiskStatus))
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Las últimas N instantáneas de un riesgo se leen en orden del índice
+        Index("ix_risk_history_risk_id_changed_at", "risk_id", "changed_at"),
+    )
+
+
+class RescoreCheckpoint(Base):
+    """
+    Progreso del trabajo de recálculo de nivel y recomendaciones. Cada lote
+    actualiza esta fila en su misma transacción, por lo que una ejecución
+    interrumpida se reanuda desde last_id con la misma política.
+    """
+    __tablename__ = "rescore_checkpoints"
+
+    name = Column(String(50), primary_key=True)
+    policy = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False)  # 'running', 'completed' o 'failed'
+    error = Column(String(500))  # Mensaje del último fallo, si status es 'failed'
+    last_id = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
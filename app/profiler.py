@@ -0,0 +1,200 @@
+"""
+Perfilador de consultas por petición (opcional, RISK_PROFILE=1).
+
+Registra cada sentencia SQL que ejecuta una petición con sus parámetros y su
+duración, agrega las cabeceras X-DB-Queries / X-DB-Time, escribe en el log
+las sentencias lentas y marca como probable N+1 las sentencias con la misma
+forma repetidas dentro de una petición. Las peores peticiones se conservan
+para /debug/profiler.
+
+El perfil activo viaja en un ContextVar; los hilos de run_in_threadpool y
+run_db heredan una copia del contexto, así que ven el mismo objeto.
+"""
+import heapq
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+ENABLED = os.getenv("RISK_PROFILE", "").lower() in ("1", "true", "yes", "on")
+# Sentencias más lentas que este umbral (ms) se escriben en el log
+SLOW_QUERY_MS = float(os.getenv("RISK_PROFILE_SLOW_MS", "100"))
+# Repeticiones de una misma forma de sentencia para considerarla N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("RISK_PROFILE_N1_THRESHOLD", "5"))
+# Peticiones conservadas en el ranking de las peores
+KEEP_WORST = int(os.getenv("RISK_PROFILE_KEEP", "20"))
+# Sentencias conservadas por petición (las restantes solo se cuentan)
+MAX_STATEMENTS = 200
+
+logger = logging.getLogger("app.profiler")
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("risk_request_profile", default=None)
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normaliza una sentencia: espacios, literales y listas IN (?, ?, ...)"""
+    shape = _SPACES.sub(" ", statement).strip()
+    shape = _LITERAL.sub("?", shape)
+    return _IN_LIST.sub("(?...)", shape)
+
+
+def _format_parameters(parameters, limit: int = 200) -> str:
+    text = repr(parameters)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.status = None
+        self.started = time.perf_counter()
+        self.total_ms = 0.0
+        self.query_count = 0
+        self.db_ms = 0.0
+        self.statements = []
+        self.shapes = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, parameters, duration_ms: float, engine: str):
+        shape = statement_shape(statement)
+        with self._lock:
+            self.query_count += 1
+            self.db_ms += duration_ms
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append({
+                    "engine": engine,
+                    "statement": statement,
+                    "parameters": _format_parameters(parameters),
+                    "duration_ms": round(duration_ms, 3),
+                })
+        if duration_ms >= SLOW_QUERY_MS:
+            logger.warning(
+                "Consulta lenta (%.1f ms) en %s %s: %s params=%s",
+                duration_ms, self.method, self.path, _SPACES.sub(" ", statement), _format_parameters(parameters)
+            )
+
+    def n_plus_one(self):
+        return [
+            {"shape": shape, "count": count}
+            for shape, count in sorted(self.shapes.items(), key=lambda item: -item[1])
+            if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+    def finish(self, status: int):
+        self.status = status
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+        suspects = self.n_plus_one()
+        if suspects:
+            logger.warning(
+                "Probable N+1 en %s %s: %s",
+                self.method, self.path, "; ".join(f"{s['count']}x {s['shape']}" for s in suspects)
+            )
+
+    def to_dict(self, include_statements: bool = True) -> dict:
+        report = {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "total_ms": round(self.total_ms, 3),
+            "db_queries": self.query_count,
+            "db_ms": round(self.db_ms, 3),
+            "n_plus_one": self.n_plus_one(),
+        }
+        if include_statements:
+            report["statements"] = sorted(self.statements, key=lambda s: -s["duration_ms"])
+        return report
+
+
+class WorstRequests:
+    """Ranking acotado de las peticiones con más tiempo en la base de datos"""
+    def __init__(self, size: int):
+        self.size = size
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        entry = (profile.db_ms, next(self._counter), profile)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, entry)
+            elif entry > self._heap[0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def items(self):
+        with self._lock:
+            entries = sorted(self._heap, reverse=True)
+        return [profile for _, _, profile in entries]
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+
+
+worst_requests = WorstRequests(KEEP_WORST)
+
+
+def instrument_engine(engine, label: str):
+    """Registra en el perfil activo cada sentencia ejecutada por el motor"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is None or not conn.info.get("profiler_started"):
+            return
+        duration_ms = (time.perf_counter() - conn.info["profiler_started"].pop()) * 1000
+        profile.record(statement, parameters, duration_ms, label)
+
+
+class ProfilerMiddleware:
+    """
+    Activa un RequestProfile por petición y agrega X-DB-Queries y X-DB-Time
+    (ms) a la respuesta. Las sentencias que se ejecutan después de enviar
+    las cabeceras (respuestas en streaming) se cuentan en el informe pero
+    no en las cabeceras.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Las consultas al propio perfilador no entran en el ranking
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(profile.query_count).encode()))
+                headers.append((b"x-db-time", f"{profile.db_ms:.3f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            profile.finish(status)
+            worst_requests.add(profile)
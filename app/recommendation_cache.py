@@ -0,0 +1,69 @@
+"""
+Caché en memoria del proceso para las plantillas de recomendaciones.
+
+Las recomendaciones automáticas dependen solo de (nivel, probabilidad,
+impacto), así que se guardan una vez en models.RecommendationTemplate y cada
+riesgo referencia su plantilla por id. Los serializadores resuelven el texto
+con este mapa en lugar de leerlo de cada fila. Las plantillas se sincronizan
+al iniciar (crud.load_recommendation_templates) y no cambian en ejecución.
+"""
+import hashlib
+from types import MappingProxyType
+from typing import Iterable, Mapping, NamedTuple, Optional, Tuple
+
+
+class Template(NamedTuple):
+    id: int
+    risk_level: str  # Nombre del enum de nivel, como se guarda en la base
+    probability: int
+    impact: int
+    text: str
+
+
+class _Snapshot(NamedTuple):
+    fingerprint: Optional[str]
+    templates: Tuple[Template, ...]
+    texts: Mapping[int, str]
+    ids: Mapping[Tuple[str, int, int], int]
+
+_EMPTY = _Snapshot(None, (), MappingProxyType({}), MappingProxyType({}))
+
+
+class RecommendationTemplateCache:
+    def __init__(self):
+        # Los lectores toman la instantánea completa con una sola lectura
+        self._snapshot = _EMPTY
+
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """Hash del contenido, para los ETag de GET /recommendation-templates"""
+        return self._snapshot.fingerprint
+
+    @property
+    def templates(self) -> Tuple[Template, ...]:
+        return self._snapshot.templates
+
+    def text(self, template_id: Optional[int]) -> Optional[str]:
+        return self._snapshot.texts.get(template_id)
+
+    def id_for(self, risk_level: str, probability: int, impact: int) -> Optional[int]:
+        return self._snapshot.ids.get((risk_level, probability, impact))
+
+    def replace(self, templates: Iterable[Template]):
+        templates = tuple(sorted(templates))
+        fingerprint = hashlib.sha256(repr(templates).encode("utf-8")).hexdigest()[:16]
+        self._snapshot = _Snapshot(
+            fingerprint,
+            templates,
+            MappingProxyType({template.id: template.text for template in templates}),
+            MappingProxyType({
+                (template.risk_level, template.probability, template.impact): template.id
+                for template in templates
+            })
+        )
+
+    def invalidate(self):
+        self._snapshot = _EMPTY
+
+
+recommendation_templates = RecommendationTemplateCache()
@@ -1,6 +1,11 @@
-# Importar los routers para facilitar el acceso
-from .risks import router as risks_router
-from .categories import router as categories_router
-
-# Lista de todos los routers disponibles
-__all__ = ["risks_router", "categories_router"]
\ No newline at end of file
+# Importar los routers para facilitar el acceso
+from .risks import router as risks_router
+from .categories import router as categories_router
+from .dashboard import router as dashboard_router
+from .metrics import router as metrics_router
+from .debug import router as debug_router
+from .admin import router as admin_router
+from .recommendations import router as recommendations_router
+
+# Lista de todos los routers disponibles
+__all__ = ["risks_router", "categories_router", "dashboard_router", "metrics_router", "debug_router", "admin_router", "recommendations_router"]
\ No newline at end of file
@@ -0,0 +1,72 @@
+import logging
+import os
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from .. import schemas, crud
+from ..database import SessionLocal, get_read_db
+
+# Las rutas de administración reescriben toda la tabla y no tienen
+# autenticación: solo existen con RISK_ADMIN=1. Sin eso se usa
+# python -m app.manage rescore
+ENABLED = os.getenv("RISK_ADMIN", "").lower() in ("1", "true", "yes", "on")
+
+def _require_admin():
+    if not ENABLED:
+        raise HTTPException(status_code=404, detail="Admin endpoints disabled")
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(_require_admin)])
+logger = logging.getLogger("app.rescore")
+
+def _rescore_status(db: Session) -> dict:
+    current_policy = crud.scoring_policy_fingerprint()
+    checkpoint = crud.get_rescore_checkpoint(db)
+    status = {"current_policy": current_policy, "running": crud.rescore_lock.locked()}
+    if checkpoint is not None:
+        status.update(
+            policy=checkpoint.policy,
+            status=checkpoint.status,
+            last_id=checkpoint.last_id,
+            processed=checkpoint.processed,
+            updated=checkpoint.updated,
+            started_at=checkpoint.started_at,
+            updated_at=checkpoint.updated_at,
+            error=checkpoint.error,
+            stale=checkpoint.policy != current_policy or checkpoint.status != "completed"
+        )
+    return status
+
+def _run_rescore(chunk_size: int, restart: bool):
+    # El lock ya fue tomado por la petición; se libera al terminar el trabajo
+    db = SessionLocal()
+    try:
+        crud.rescore_risks(db, chunk_size=chunk_size, restart=restart)
+    except Exception:
+        # crud ya guardó el error en el checkpoint; GET /admin/rescore lo muestra
+        logger.exception("Rescore job failed")
+    finally:
+        db.close()
+        crud.rescore_lock.release()
+
+@router.get("/rescore", response_model=schemas.RescoreStatus)
+def read_rescore_status(db: Session = Depends(get_read_db)):
+    return _rescore_status(db)
+
+@router.post("/rescore", response_model=schemas.RescoreStatus, status_code=202)
+def start_rescore(
+    background_tasks: BackgroundTasks,
+    chunk_size: int = Query(crud.RESCORE_CHUNK_SIZE, ge=1, le=10000),
+    restart: bool = False,
+    db: Session = Depends(get_read_db)
+):
+    if not crud.rescore_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Rescore already running")
+    try:
+        status = _rescore_status(db)
+    except Exception:
+        # Sin respuesta la tarea no se ejecuta y no liberaría el lock
+        crud.rescore_lock.release()
+        raise
+    background_tasks.add_task(_run_rescore, chunk_size, restart)
+    return status
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from typing import List
 
-from .. import schemas, crud
-from ..database import get_db
+from .. import schemas, crud, http_cache
+from ..database import get_db, get_read_db
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
@@ -12,22 +13,41 @@ def create_category(category: schemas.RiskCategoryCreate, db: Session = Depends(
     return crud.create_category(db=db, category=category)
 
 @router.get("/", response_model=List[schemas.RiskCategory])
-def read_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_categories(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    etag = http_cache.make_etag("categories", crud.get_collection_version(db, crud.CATEGORIES_COLLECTION))
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_etag(response, etag)
+
     categories = crud.get_categories(db, skip=skip, limit=limit)
     return categories
 
 @router.get("/{category_id}", response_model=schemas.RiskCategory)
-def read_category(category_id: int, db: Session = Depends(get_db)):
+def read_category(category_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    etag = http_cache.make_etag("category", category_id, crud.get_collection_version(db, crud.CATEGORIES_COLLECTION))
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_etag(response, etag)
+
     db_category = crud.get_category(db, category_id=category_id)
     if db_category is None:
         raise HTTPException(status_code=404, detail="Category not found")
     return db_category
 
 @router.put("/{category_id}", response_model=schemas.RiskCategory)
-def update_category(category_id: int, category_update: schemas.RiskCategoryCreate, db: Session = Depends(get_db)):
-    db_category = crud.update_category(db, category_id=category_id, category_update=category_update)
+def update_category(category_id: int, category_update: schemas.RiskCategoryCreate, request: Request,
+                    response: Response, db: Session = Depends(get_db)):
+    # If-Match con el ETag de GET /categories/{id} (versión de la colección)
+    expected_version = http_cache.if_match_version(request, "category", category_id)
+    try:
+        db_category = crud.update_category(db, category_id=category_id, category_update=category_update,
+                                           expected_version=expected_version)
+    except StaleDataError:
+        raise HTTPException(status_code=409, detail="Category was modified by another request")
     if db_category is None:
         raise HTTPException(status_code=404, detail="Category not found")
+    etag = http_cache.make_etag("category", category_id, crud.get_collection_version(db, crud.CATEGORIES_COLLECTION))
+    http_cache.set_etag(response, etag)
     return db_category
 
 @router.delete("/{category_id}")
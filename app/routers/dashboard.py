@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from .. import schemas, crud
+from ..database import get_read_db
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+@router.get("/", response_model=schemas.DashboardSummary)
+def read_dashboard(recent: int = 5, db: Session = Depends(get_read_db)):
+    return crud.get_dashboard_summary(db, recent_limit=recent)
+
+@router.get("/stats", response_model=schemas.RiskStats)
+def read_risk_stats(db: Session = Depends(get_read_db)):
+    return crud.get_risk_stats(db)
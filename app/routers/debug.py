@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from .. import profiler
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+def _require_profiler():
+    # Sin RISK_PROFILE=1 el perfilador no existe para los clientes
+    if not profiler.ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled")
+
+@router.get("/profiler")
+def read_worst_requests(
+    limit: int = Query(10, ge=1, le=profiler.KEEP_WORST),
+    statements: bool = True
+):
+    _require_profiler()
+    return {
+        "slow_query_ms": profiler.SLOW_QUERY_MS,
+        "n_plus_one_threshold": profiler.N_PLUS_ONE_THRESHOLD,
+        "requests": [
+            profile.to_dict(include_statements=statements)
+            for profile in profiler.worst_requests.items()[:limit]
+        ]
+    }
+
+@router.delete("/profiler", status_code=204)
+def reset_worst_requests():
+    _require_profiler()
+    profiler.worst_requests.clear()
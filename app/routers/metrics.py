@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy.orm import Session
+
+from .. import crud, metrics
+from ..database import engine, read_engine, get_read_db
+
+router = APIRouter(tags=["metrics"])
+
+# Conteos por (estado, nivel) de la última versión de la colección de riesgos;
+# solo se recalculan con GROUP BY cuando la colección cambió
+_risk_counts = {"version": None, "counts": {}}
+
+def _collect_risk_counts(db: Session):
+    version = crud.get_collection_version(db, crud.RISKS_COLLECTION)
+    if version != _risk_counts["version"]:
+        counts = {}
+        for status, level, count in crud._count_risks_by_status_and_level(db):
+            key = (
+                crud.API_STATUS[status].value if status is not None else "",
+                level.value if level is not None else ""
+            )
+            counts[key] = counts.get(key, 0) + count
+        _risk_counts.update(version=version, counts=counts)
+    metrics.collect_risk_counts(_risk_counts["counts"])
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics(db: Session = Depends(get_read_db)):
+    _collect_risk_counts(db)
+    metrics.collect_pool_usage({"writer": engine, "reader": read_engine})
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Request, Response
+from typing import List
+
+from .. import schemas, crud, http_cache
+
+router = APIRouter(prefix="/recommendation-templates", tags=["recommendations"])
+
+@router.get("/", response_model=List[schemas.RecommendationTemplate])
+def read_recommendation_templates(request: Request, response: Response):
+    # Las plantillas se sirven desde la caché en memoria; su hash es el ETag
+    etag = http_cache.make_etag("recommendation-templates", crud.recommendation_templates.fingerprint)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_etag(response, etag)
+    return [template._asdict() for template in crud.get_recommendation_templates()]
@@ -1,57 +1,310 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-
-from .. import schemas, crud
-from ..database import get_db
-
-
-router = APIRouter(prefix="/risks", tags=["risks"])
-
-
-
-@router.post("/", response_model=schemas.Risk)
-def create_risk(risk: schemas.RiskCreate, db: Session = Depends(get_db)):
-    return crud.create_risk(db=db, risk=risk)
-
-@router.get("/", response_model=List[schemas.Risk])
-def read_risks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    risks = crud.get_risks(db, skip=skip, limit=limit)
-    return risks
-
-@router.get("/{risk_id}", response_model=schemas.Risk)
-def read_risk(risk_id: int, db: Session = Depends(get_db)):
-    db_risk = crud.get_risk(db, risk_id=risk_id)
-    if db_risk is None:
-        raise HTTPException(status_code=404, detail="Risk not found")
-    return db_risk
-
-@router.put("/{risk_id}", response_model=schemas.Risk)
-def update_risk(risk_id: int, risk_update: schemas.RiskUpdate, db: Session = Depends(get_db)):
-    db_risk = crud.update_risk(db, risk_id=risk_id, risk_update=risk_update)
-    if db_risk is None:
-        raise HTTPException(status_code=404, detail="Risk not found")
-    return db_risk
-
-@router.delete("/{risk_id}")
-def delete_risk(risk_id: int, db: Session = Depends(get_db)):
-    db_risk = crud.delete_risk(db, risk_id=risk_id)
-    if db_risk is None:
-        raise HTTPException(status_code=404, detail="Risk not found")
-    return {"message": "Risk deleted successfully"}
-
-@router.get("/{risk_id}/recommendations", response_model=schemas.RiskWithRecommendations)
-def get_risk_recommendations(risk_id: int, db: Session = Depends(get_db)):
-    db_risk = crud.get_risk(db, risk_id=risk_id)
-    if db_risk is None:
-        raise HTTPException(status_code=404, detail="Risk not found")
-    
-    # Generar recomendaciones detalladas
-    detailed_recommendations = crud.get_detailed_recommendations(
-        db_risk.risk_level, db_risk.probability, db_risk.impact
-    )
-    
-    return {
-        **db_risk.__dict__,
-        "detailed_recommendations": detailed_recommendations
-    }
\ No newline at end of file
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Optional, Union
+
+from .. import schemas, crud, bulk_io, events, fast_json, http_cache
+from ..database import get_db, get_read_db, ReadSessionLocal
+
+
+router = APIRouter(prefix="/risks", tags=["risks"])
+
+
+
+@router.post("/", response_model=schemas.Risk)
+def create_risk(risk: schemas.RiskCreate, db: Session = Depends(get_db)):
+    try:
+        return crud.create_risk(db=db, risk=risk)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Category not found")
+
+def _format_recommendations(risks, recommendations: schemas.RecommendationFormat):
+    # Con recommendations=ref el texto de plantilla no se repite en cada riesgo;
+    # el cliente lo resuelve con GET /recommendation-templates/
+    if recommendations == schemas.RecommendationFormat.TEXT:
+        return risks
+    return [
+        schemas.Risk.model_validate(risk, from_attributes=True).copy(
+            update={"recommendations": risk.custom_recommendations}
+        )
+        for risk in risks
+    ]
+
+@router.get("/", response_model=Union[schemas.RiskPage, List[schemas.Risk]])
+def read_risks(
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: schemas.RiskSortKey = schemas.RiskSortKey.CREATED_AT,
+    order: schemas.SortOrder = schemas.SortOrder.ASC,
+    filters: schemas.RiskFilter = Depends(),
+    recommendations: schemas.RecommendationFormat = schemas.RecommendationFormat.TEXT,
+    request: Request = None,
+    response: Response = None,
+    db: Session = Depends(get_read_db)
+):
+    etag = http_cache.make_etag("risks", crud.get_collection_version(db, crud.RISKS_COLLECTION), recommendations.value)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+
+    # Sin cursor se mantiene la paginación por offset para clientes existentes;
+    # con cursor (vacío para la primera página) se responde con next_cursor.
+    # La lista por offset puede ser muy grande: se arma desde las filas y se
+    # serializa con fast_json, sin pasar por response_model
+    if cursor is None:
+        rows = crud.get_risk_rows(db, skip=skip, limit=limit, filters=filters, recommendations=recommendations)
+        return fast_json.json_response(request, rows, headers=http_cache.etag_headers(etag))
+    http_cache.set_etag(response, etag)
+    try:
+        risks, next_cursor = crud.get_risks_page(
+            db, limit=limit, cursor=cursor, sort=sort, order=order, filters=filters
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": _format_recommendations(risks, recommendations), "next_cursor": next_cursor}
+
+@router.get("/summary", response_model=List[schemas.RiskSummary])
+def read_risk_summaries(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    filters: schemas.RiskFilter = Depends(),
+    db: Session = Depends(get_read_db)
+):
+    # Incluye category_name: renombrar una categoría también cambia la respuesta
+    etag = http_cache.make_etag(
+        "risks-summary",
+        crud.get_collection_version(db, crud.RISKS_COLLECTION),
+        crud.get_collection_version(db, crud.CATEGORIES_COLLECTION)
+    )
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_etag(response, etag)
+    return crud.get_risk_summaries(db, skip=skip, limit=limit, filters=filters)
+
+@router.get("/heatmap", response_model=schemas.RiskHeatmap)
+def read_risk_heatmap(
+    request: Request,
+    response: Response,
+    category_id: Optional[int] = None,
+    status: Optional[schemas.RiskStatus] = None,
+    db: Session = Depends(get_read_db)
+):
+    etag = http_cache.make_etag(
+        "risks-heatmap",
+        crud.get_collection_version(db, crud.RISKS_COLLECTION),
+        crud.get_collection_version(db, crud.CATEGORIES_COLLECTION)
+    )
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_etag(response, etag)
+    return crud.get_risk_heatmap(db, category_id=category_id, status=status)
+
+@router.get("/trends", response_model=List[schemas.RiskTrend])
+def read_risk_trends(
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    window: int = Query(crud.TREND_WINDOW, ge=2, le=50),
+    filters: schemas.RiskFilter = Depends(),
+    db: Session = Depends(get_read_db)
+):
+    return crud.get_risk_trends(db, skip=skip, limit=limit, filters=filters, window=window)
+
+@router.get("/changes", response_model=schemas.RiskChanges)
+def read_risk_changes(
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    recommendations: schemas.RecommendationFormat = schemas.RecommendationFormat.TEXT,
+    db: Session = Depends(get_read_db)
+):
+    # Sin since se entregan todos los riesgos; el cliente sigue pidiendo con
+    # next_token mientras has_more sea verdadero
+    try:
+        risks, deleted, next_token, has_more = crud.get_risk_changes(db, since=since, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid change token")
+    category_names = crud.get_category_names(db)
+    items = [
+        schemas.RiskChange.model_validate(risk, from_attributes=True).copy(
+            update={"category_name": category_names.get(risk.category_id)}
+        )
+        for risk in _format_recommendations(risks, recommendations)
+    ]
+    return {
+        "items": items,
+        "deleted": deleted,
+        "next_token": next_token,
+        "has_more": has_more,
+    }
+
+@router.patch("", response_model=schemas.RiskBulkUpdateResult)
+@router.patch("/", response_model=schemas.RiskBulkUpdateResult, include_in_schema=False)
+def bulk_update_risks(bulk_update: schemas.RiskBulkUpdate, db: Session = Depends(get_db)):
+    filters = bulk_update.filters.dict(exclude_none=True) if bulk_update.filters else None
+    # Sin ids ni filtros el UPDATE alcanzaría a todos los riesgos
+    if bulk_update.ids is None and not filters:
+        raise HTTPException(status_code=400, detail="Provide ids or filters to select risks")
+    if not bulk_update.changes.dict(exclude_unset=True):
+        raise HTTPException(status_code=400, detail="No changes provided")
+    try:
+        ids = crud.bulk_update_risks(db, bulk_update.changes, ids=bulk_update.ids, filters=filters)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Category not found")
+    return {"updated": len(ids), "ids": ids if bulk_update.return_ids else None}
+
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+def bulk_import_risks(
+    file: UploadFile = File(...),
+    format: Optional[schemas.BulkFormat] = None,
+    batch_size: int = Query(500, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    fmt = format or bulk_io.detect_format(file.filename, file.content_type)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Unknown file format, use format=csv or format=ndjson")
+    # El archivo se recorre en streaming desde el archivo temporal del upload
+    records = bulk_io.iter_records(file.file, fmt)
+    return crud.bulk_create_risks(db, records, batch_size=batch_size)
+
+@router.get("/export")
+def export_risks(
+    format: schemas.BulkFormat = schemas.BulkFormat.CSV,
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    filters: schemas.RiskFilter = Depends()
+):
+    columns = [column.key for column in crud.EXPORT_COLUMNS]
+
+    def generate():
+        # La sesión vive mientras dura el streaming, no la del request
+        db = ReadSessionLocal()
+        try:
+            chunks = crud.iter_risk_export(db, filters=filters, chunk_size=chunk_size)
+            yield from bulk_io.iter_export(format, columns, chunks)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type=bulk_io.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="risks.{format.value}"'}
+    )
+
+@router.get("/search", response_model=List[schemas.RiskSearchHit])
+def search_risks(
+    q: str,
+    limit: int = Query(20, ge=1, le=200),
+    filters: schemas.RiskFilter = Depends(),
+    db: Session = Depends(get_read_db)
+):
+    try:
+        hits = crud.search_risks(db, q, limit=limit, filters=filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Search query has no searchable terms")
+    # Desde el objeto ORM: __dict__ no incluye la propiedad recommendations
+    return [
+        schemas.RiskSearchHit(
+            **schemas.Risk.model_validate(risk, from_attributes=True).dict(), rank=rank, snippet=snippet
+        )
+        for risk, rank, snippet in hits
+    ]
+
+@router.get("/events")
+async def stream_risk_events(request: Request):
+    """
+    Flujo Server-Sent Events con los cambios de riesgos (created, updated,
+    deleted, bulk y resync). El id de cada evento es la versión de la
+    colección; sin eventos se envía un comentario cada HEARTBEAT_INTERVAL.
+    """
+    subscriber = events.risk_events.subscribe()
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await subscriber.get(timeout=events.HEARTBEAT_INTERVAL)
+                yield events.format_sse(event) if event is not None else ": ping\n\n"
+        finally:
+            events.risk_events.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{risk_id}", response_model=schemas.Risk)
+def read_risk(risk_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    version = crud.get_risk_version(db, risk_id=risk_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Risk not found")
+    etag = http_cache.make_etag("risk", risk_id, version)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_etag(response, etag)
+
+    db_risk = crud.get_risk(db, risk_id=risk_id)
+    if db_risk is None:
+        raise HTTPException(status_code=404, detail="Risk not found")
+    return db_risk
+
+@router.put("/{risk_id}", response_model=schemas.Risk)
+def update_risk(risk_id: int, risk_update: schemas.RiskUpdate, request: Request, response: Response,
+                db: Session = Depends(get_db)):
+    # If-Match con el ETag de GET /risks/{id}: solo se escribe sobre esa versión
+    expected_version = http_cache.if_match_version(request, "risk", risk_id)
+    try:
+        db_risk = crud.update_risk(db, risk_id=risk_id, risk_update=risk_update,
+                                   expected_version=expected_version)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Category not found")
+    except StaleDataError:
+        raise HTTPException(status_code=409, detail="Risk was modified by another request")
+    if db_risk is None:
+        raise HTTPException(status_code=404, detail="Risk not found")
+    http_cache.set_etag(response, http_cache.make_etag("risk", risk_id, db_risk.version))
+    return db_risk
+
+@router.delete("/{risk_id}")
+def delete_risk(risk_id: int, db: Session = Depends(get_db)):
+    db_risk = crud.delete_risk(db, risk_id=risk_id)
+    if db_risk is None:
+        raise HTTPException(status_code=404, detail="Risk not found")
+    return {"message": "Risk deleted successfully"}
+
+@router.get("/{risk_id}/analysis", response_model=schemas.RiskAnalysis)
+def read_risk_analysis(
+    risk_id: int,
+    window: int = Query(crud.TREND_WINDOW, ge=2, le=50),
+    db: Session = Depends(get_read_db)
+):
+    analysis = crud.get_risk_analysis(db, risk_id=risk_id, window=window)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Risk not found")
+    return analysis
+
+@router.get("/{risk_id}/recommendations", response_model=schemas.RiskWithRecommendations)
+def get_risk_recommendations(risk_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    version = crud.get_risk_version(db, risk_id=risk_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Risk not found")
+    # El texto detallado depende también de los umbrales de puntuación vigentes
+    etag = http_cache.make_etag("recommendations", risk_id, version, *crud.get_scoring_thresholds())
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(etag)
+    http_cache.set_etag(response, etag)
+
+    db_risk = crud.get_risk(db, risk_id=risk_id)
+    if db_risk is None:
+        raise HTTPException(status_code=404, detail="Risk not found")
+    
+    # Generar recomendaciones detalladas
+    detailed_recommendations = crud.get_detailed_recommendations(
+        db_risk.risk_level, db_risk.probability, db_risk.impact
+    )
+    
+    risk = schemas.RiskWithRecommendations.model_validate(db_risk, from_attributes=True)
+    risk.detailed_recommendations = detailed_recommendations
+    return risk
\ No newline at end of file
@@ -1,147 +1,275 @@
-from pydantic import BaseModel
-from typing import Optional, List
-from enum import Enum
-
-class RiskLevel(str, Enum):
-    LOW = "LOW"
-    MEDIUM = "MEDIUM"
-    HIGH = "HIGH"
-    CRITICAL = "CRITICAL"
-
-class RiskStatus(str, Enum):
-    OPEN = "OPEN"
-    IN_PROGRESS = "IN_PROGRESS"
-    CLOSED = "CLOSED"
-    MITIGATED = "MITIGATED"
-
-class RiskCategoryBase(BaseModel):
-    name: str
-    description: Optional[str] = None
-
-class RiskCategoryCreate(RiskCategoryBase):
-    pass
-
-class RiskCategory(RiskCategoryBase):
-    id: int
-    
-    class Config:
-        orm_mode = True
-
-class RiskBase(BaseModel):
-    title: str
-    description: str
-    probability: int
-    impact: int
-    owner: str
-    mitigation_plan: Optional[str] = None
-    category_id: int
-
-class RiskCreate(RiskBase):
-    pass
-
-class RiskUpdate(BaseModel):
-    title: Optional[str] = None
-    description: Optional[str] = None
-    probability: Optional[int] = None
-    impact: Optional[int] = None
-    status: Optional[RiskStatus] = None
-    owner: Optional[str] = None
-    mitigation_plan: Optional[str] = None
-    category_id: Optional[int] = None
-
-class Risk(RiskBase):
-    id: int
-    risk_level: RiskLevel
-    status: RiskStatus
-    recommendations: str  # Nuevo campo para recomendaciones automáticas
-    
-    class Config:
-        orm_mode = True
-
-class RiskWithRecommendations(Risk):
-    """Schema extendido con recomendaciones detalladas"""
-    detailed_recommendations: Optional[str] = None
-    
-    class Config:
-        orm_mode = True
-
-# Schemas para responses con información adicional
-class RiskSummary(BaseModel):
-    id: int
-    title: str
-    risk_level: RiskLevel
-    probability: int
-    impact: int
-    score: int
-    owner: str
-    status: RiskStatus
-    category_name: Optional[str] = None
-    
-    class Config:
-        orm_mode = True
-
-class RiskLevelSummary(BaseModel):
-    level: RiskLevel
-    count: int
-    percentage: float
-
-class DashboardSummary(BaseModel):
-    total_risks: int
-    risks_by_level: List[RiskLevelSummary]
-    critical_risks_count: int
-    high_risks_count: int
-    recent_risks: List[RiskSummary]
-
-# Schema para estadísticas y reportes
-class RiskStats(BaseModel):
-    total: int
-    open: int
-    in_progress: int
-    closed: int
-    mitigated: int
-    by_level: dict
-
-class CategoryStats(BaseModel):
-    category_id: int
-    category_name: str
-    risk_count: int
-    average_score: float
-
-# Schema para filtros de búsqueda
-class RiskFilter(BaseModel):
-    category_id: Optional[int] = None
-    risk_level: Optional[RiskLevel] = None
-    status: Optional[RiskStatus] = None
-    probability_min: Optional[int] = None
-    probability_max: Optional[int] = None
-    impact_min: Optional[int] = None
-    impact_max: Optional[int] = None
-    owner: Optional[str] = None
-
-# Schema para recomendaciones personalizadas
-class RecommendationRequest(BaseModel):
-    probability: int
-    impact: int
-    risk_level: RiskLevel
-    category: Optional[str] = None
-
-class RecommendationResponse(BaseModel):
-    risk_level: RiskLevel
-    score: int
-    general_recommendations: List[str]
-    specific_recommendations: List[str]
-    urgency_level: str
-
-# Schema para actualización de recomendaciones
-class UpdateRecommendationsRequest(BaseModel):
-    risk_id: int
-    custom_recommendations: Optional[str] = None
-
-class RiskAnalysis(BaseModel):
-    risk_id: int
-    title: str
-    current_level: RiskLevel
-    predicted_level: Optional[RiskLevel] = None
-    trend: Optional[str] = None  # 'improving', 'worsening', 'stable'
-    recommendations: List[str]
-    action_plan: Optional[str] = None
+from pydantic import BaseModel, field_validator
+from typing import Optional, List
+from enum import Enum
+from datetime import datetime
+
+class RiskLevel(str, Enum):
+    LOW = "LOW"
+    MEDIUM = "MEDIUM"
+    HIGH = "HIGH"
+    CRITICAL = "CRITICAL"
+
+class RiskStatus(str, Enum):
+    OPEN = "OPEN"
+    IN_PROGRESS = "IN_PROGRESS"
+    CLOSED = "CLOSED"
+    MITIGATED = "MITIGATED"
+
+    @classmethod
+    def _missing_(cls, value):
+        # La base guarda "IN-PROGRESS" (models.RiskStatus); se lee como IN_PROGRESS
+        if isinstance(value, str):
+            return cls.__members__.get(value.replace("-", "_"))
+        return None
+
+class RiskSortKey(str, Enum):
+    ID = "id"
+    CREATED_AT = "created_at"
+    RISK_LEVEL = "risk_level"
+
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+class RecommendationFormat(str, Enum):
+    TEXT = "text"  # Texto completo en cada riesgo
+    REF = "ref"    # Solo recommendation_template_id si el riesgo usa una plantilla
+
+class RiskCategoryBase(BaseModel):
+    name: str
+    description: Optional[str] = None
+
+class RiskCategoryCreate(RiskCategoryBase):
+    pass
+
+class RiskCategory(RiskCategoryBase):
+    id: int
+    
+    class Config:
+        orm_mode = True
+
+class RiskBase(BaseModel):
+    title: str
+    description: str
+    probability: int
+    impact: int
+    owner: str
+    mitigation_plan: Optional[str] = None
+    category_id: int
+
+class RiskCreate(RiskBase):
+    pass
+
+class RiskUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    probability: Optional[int] = None
+    impact: Optional[int] = None
+    status: Optional[RiskStatus] = None
+    owner: Optional[str] = None
+    mitigation_plan: Optional[str] = None
+    category_id: Optional[int] = None
+
+    @field_validator("title", "description", "probability", "impact", "owner", "status")
+    @classmethod
+    def not_null(cls, value):
+        # Se pueden omitir, pero null dejaría el riesgo sin nivel calculable o
+        # sin un campo que schemas.Risk exige al leerlo
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
+class Risk(RiskBase):
+    id: int
+    category_id: Optional[int] = None  # Sin categoría si esta se eliminó
+    risk_level: RiskLevel
+    status: RiskStatus
+    recommendations: Optional[str] = None  # Nuevo campo para recomendaciones automáticas
+    recommendation_template_id: Optional[int] = None
+    
+    class Config:
+        orm_mode = True
+
+class RiskPage(BaseModel):
+    """Página de riesgos con cursor para solicitar la siguiente"""
+    items: List[Risk]
+    next_cursor: Optional[str] = None
+
+class RiskChange(Risk):
+    """Riesgo en GET /risks/changes, con el nombre de su categoría"""
+    category_name: Optional[str] = None
+
+class RiskChanges(BaseModel):
+    """
+    Cambios desde un token de GET /risks/changes. `deleted` se aplica antes
+    que `items` (un id eliminado puede volver a usarse en un riesgo nuevo).
+    """
+    items: List[RiskChange]
+    deleted: List[int]
+    next_token: str
+    has_more: bool
+
+class RiskSearchHit(Risk):
+    """Resultado de búsqueda de texto completo"""
+    rank: float
+    snippet: Optional[str] = None
+
+class RiskWithRecommendations(Risk):
+    """Schema extendido con recomendaciones detalladas"""
+    detailed_recommendations: Optional[str] = None
+    
+    class Config:
+        orm_mode = True
+
+# Schemas para responses con información adicional
+class RiskSummary(BaseModel):
+    id: int
+    title: str
+    risk_level: RiskLevel
+    probability: int
+    impact: int
+    score: int
+    owner: str
+    status: RiskStatus
+    category_name: Optional[str] = None
+    
+    class Config:
+        orm_mode = True
+
+class RiskLevelSummary(BaseModel):
+    level: RiskLevel
+    count: int
+    percentage: float
+
+class DashboardSummary(BaseModel):
+    total_risks: int
+    risks_by_level: List[RiskLevelSummary]
+    critical_risks_count: int
+    high_risks_count: int
+    recent_risks: List[RiskSummary]
+
+# Schema para estadísticas y reportes
+class RiskStats(BaseModel):
+    total: int
+    open: int
+    in_progress: int
+    closed: int
+    mitigated: int
+    by_level: dict
+
+class CategoryStats(BaseModel):
+    category_id: int
+    category_name: str
+    risk_count: int
+    average_score: float
+
+# Schemas para importación masiva
+class BulkFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+class BulkImportError(BaseModel):
+    row: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
+    errors_truncated: bool = False
+
+# Schema para filtros de búsqueda
+class RiskFilter(BaseModel):
+    category_id: Optional[int] = None
+    risk_level: Optional[RiskLevel] = None
+    status: Optional[RiskStatus] = None
+    probability_min: Optional[int] = None
+    probability_max: Optional[int] = None
+    impact_min: Optional[int] = None
+    impact_max: Optional[int] = None
+    owner: Optional[str] = None
+
+class RiskBulkUpdate(BaseModel):
+    """Cambios parciales aplicados a los riesgos seleccionados por ids y/o filtros"""
+    ids: Optional[List[int]] = None
+    filters: Optional[RiskFilter] = None
+    changes: RiskUpdate
+    return_ids: bool = False
+
+class RiskBulkUpdateResult(BaseModel):
+    updated: int
+    ids: Optional[List[int]] = None
+
+class RecommendationTemplate(BaseModel):
+    id: int
+    risk_level: RiskLevel
+    probability: int
+    impact: int
+    text: str
+
+# Schema para recomendaciones personalizadas
+class RecommendationRequest(BaseModel):
+    probability: int
+    impact: int
+    risk_level: RiskLevel
+    category: Optional[str] = None
+
+class RecommendationResponse(BaseModel):
+    risk_level: RiskLevel
+    score: int
+    general_recommendations: List[str]
+    specific_recommendations: List[str]
+    urgency_level: str
+
+# Schema para actualización de recomendaciones
+class UpdateRecommendationsRequest(BaseModel):
+    risk_id: int
+    custom_recommendations: Optional[str] = None
+
+class RiskAnalysis(BaseModel):
+    risk_id: int
+    title: str
+    current_level: RiskLevel
+    predicted_level: Optional[RiskLevel] = None
+    trend: Optional[str] = None  # 'improving', 'worsening', 'stable'
+    recommendations: List[str]
+    action_plan: Optional[str] = None
+
+
+class HeatmapMatrix(BaseModel):
+    """Matriz 5x5: matrix[p - 1][i - 1] es la cantidad con probabilidad p e impacto i"""
+    total: int
+    matrix: List[List[int]]
+
+class CategoryHeatmap(HeatmapMatrix):
+    category_id: Optional[int] = None  # None: riesgos sin categoría
+    category_name: Optional[str] = None
+
+class StatusHeatmap(HeatmapMatrix):
+    status: RiskStatus
+
+class RiskHeatmap(HeatmapMatrix):
+    by_category: List[CategoryHeatmap]
+    by_status: List[StatusHeatmap]
+
+class RiskTrend(BaseModel):
+    risk_id: int
+    current_level: RiskLevel
+    predicted_level: RiskLevel
+    trend: str  # 'improving', 'worsening', 'stable'
+    snapshots: int
+
+
+class RescoreStatus(BaseModel):
+    """Estado del trabajo de recálculo frente a la política de puntuación vigente"""
+    current_policy: str
+    policy: Optional[str] = None
+    status: Optional[str] = None  # 'running', 'completed', 'failed' o None si nunca se ejecutó
+    error: Optional[str] = None
+    last_id: int = 0
+    processed: int = 0
+    updated: int = 0
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    running: bool = False
+    stale: bool = True
@@ -0,0 +1,131 @@
+"""
+Búsqueda de texto completo sobre los riesgos con SQLite FTS5.
+La tabla virtual risks_fts usa la vista risks_search como contenido externo
+y se mantiene sincronizada mediante triggers sobre risks, de modo que
+cualquier escritura (ORM, importación masiva o SQL directo) queda indexada.
+La vista resuelve las recomendaciones de plantilla, así que también se
+indexa el texto de models.RecommendationTemplate.
+"""
+import html
+import re
+
+from sqlalchemy import column, func, literal_column, table, text
+
+FTS_COLUMNS = ("title", "description", "mitigation_plan", "recommendations")
+
+_columns = ", ".join(FTS_COLUMNS)
+
+def _row_values(row: str) -> str:
+    # Mismo texto que la vista risks_search para la fila new/old del trigger
+    return (
+        f"{row}.title, {row}.description, {row}.mitigation_plan, "
+        f"coalesce({row}.recommendations, (SELECT text FROM recommendation_templates "
+        f"WHERE id = {row}.recommendation_template_id))"
+    )
+
+_new_values = _row_values("new")
+_old_values = _row_values("old")
+
+FTS_CONTENT_VIEW = "risks_search"
+
+FTS_VIEW_DDL = f"""
+CREATE VIEW IF NOT EXISTS {FTS_CONTENT_VIEW} AS
+SELECT risks.id, risks.title, risks.description, risks.mitigation_plan,
+       coalesce(risks.recommendations, recommendation_templates.text) AS recommendations
+FROM risks
+LEFT JOIN recommendation_templates ON recommendation_templates.id = risks.recommendation_template_id
+"""
+
+FTS_TABLE_DDL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS risks_fts USING fts5(
+    {_columns},
+    content='{FTS_CONTENT_VIEW}',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+FTS_TRIGGERS_DDL = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS risks_fts_ai AFTER INSERT ON risks BEGIN
+        INSERT INTO risks_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS risks_fts_ad AFTER DELETE ON risks BEGIN
+        INSERT INTO risks_fts(risks_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS risks_fts_au AFTER UPDATE OF {_columns}, recommendation_template_id ON risks BEGIN
+        INSERT INTO risks_fts(risks_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO risks_fts(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+)
+
+# Tabla ligera para construir las consultas con SQLAlchemy
+risks_fts = table("risks_fts", column("rowid"))
+_fts_ref = literal_column("risks_fts")
+
+# Marcadores que no aparecen en texto normal; se reemplazan por <mark> después
+# de escapar el HTML del fragmento
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+_TOKEN_RE = re.compile(r"[\w]+\*?", re.UNICODE)
+
+def ensure_fts(connection):
+    """
+    Crea la vista de contenido, la tabla FTS5 y sus triggers si no existen.
+    Un índice creado con otra definición (contenido directo de risks) se
+    descarta junto con sus triggers. Si la tabla se crea en una base con
+    riesgos previos, se reconstruye el índice completo.
+    """
+    existing = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'risks_fts'")
+    ).scalar()
+    exists = existing is not None and f"content='{FTS_CONTENT_VIEW}'" in existing
+    if existing is not None and not exists:
+        connection.execute(text("DROP TABLE risks_fts"))
+        for trigger in ("risks_fts_ai", "risks_fts_ad", "risks_fts_au"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    connection.execute(text(FTS_VIEW_DDL))
+    connection.execute(text(FTS_TABLE_DDL))
+    for ddl in FTS_TRIGGERS_DDL:
+        connection.execute(text(ddl))
+    if not exists:
+        rebuild_fts(connection)
+
+def rebuild_fts(connection):
+    """Reconstruye el índice FTS a partir del contenido actual de risks_search"""
+    connection.execute(text("INSERT INTO risks_fts(risks_fts) VALUES ('rebuild')"))
+
+def build_match_query(q: str) -> str:
+    """
+    Convierte el texto del usuario en una expresión MATCH segura: cada palabra
+    se cita como frase y un '*' final se conserva como búsqueda por prefijo.
+    Las palabras se combinan con AND implícito.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(q or ""):
+        word = token.rstrip("*")
+        terms.append(f'"{word}"*' if token.endswith("*") else f'"{word}"')
+    return " ".join(terms)
+
+def match(expression: str):
+    return _fts_ref.op("MATCH")(expression)
+
+def rank():
+    """Relevancia bm25 (valores menores son más relevantes)"""
+    return func.bm25(_fts_ref)
+
+def snippet(tokens: int = 12):
+    """Fragmento del texto con las coincidencias marcadas, en cualquier columna"""
+    return func.snippet(_fts_ref, -1, _MARK_START, _MARK_END, "…", tokens)
+
+def highlight_html(fragment: str) -> str:
+    """Escapa el fragmento y marca las coincidencias con <mark>"""
+    if fragment is None:
+        return None
+    escaped = html.escape(fragment)
+    return escaped.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
@@ -0,0 +1,102 @@
+"""
+Plantillas Jinja de las vistas HTML y caché de fragmentos de filas.
+
+Las plantillas se compilan una vez por proceso (Jinja las guarda en memoria)
+y el bytecode se guarda en disco, así otros workers y los reinicios no
+vuelven a compilarlas. Sin RISK_TEMPLATE_RELOAD=1 tampoco se comprueba la
+fecha del archivo en cada petición.
+
+Cada fila de la lista de riesgos se renderiza una vez por versión de la fila
+(models.Risk.version) y nombre de categoría; una página sin cambios se arma
+concatenando fragmentos de la caché sin volver a ejecutar Jinja.
+"""
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from app import schemas
+
+TEMPLATES_DIR = "templates"
+BYTECODE_CACHE_DIR = os.getenv(
+    "RISK_JINJA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "risk-jinja-cache")
+)
+TEMPLATE_RELOAD = os.getenv("RISK_TEMPLATE_RELOAD", "").lower() in ("1", "true", "yes", "on")
+# Filas renderizadas que se conservan (LRU)
+FRAGMENT_CACHE_SIZE = int(os.getenv("RISK_FRAGMENT_CACHE_SIZE", "5000"))
+
+os.makedirs(BYTECODE_CACHE_DIR, exist_ok=True)
+templates = Jinja2Templates(
+    directory=TEMPLATES_DIR,
+    bytecode_cache=FileSystemBytecodeCache(BYTECODE_CACHE_DIR),
+    auto_reload=TEMPLATE_RELOAD,
+)
+
+
+class FragmentCache:
+    """Caché LRU acotada de fragmentos HTML ya escapados"""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            fragment = self._items.get(key)
+            if fragment is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return fragment
+
+    def put(self, key, fragment: Markup):
+        with self._lock:
+            self._items[key] = fragment
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+risk_row_fragments = FragmentCache(FRAGMENT_CACHE_SIZE)
+
+
+def render_risk_rows(rows, category_names) -> Markup:
+    """
+    HTML de las filas de templates/_risk_row.html para las filas dadas (con
+    las columnas de crud.RISK_ROW_COLUMNS). La clave incluye la versión de la
+    fila: cualquier escritura la incrementa y deja la entrada anterior sin uso.
+    """
+    template = None
+    fragments = []
+    for row in rows:
+        category_name = category_names.get(row.category_id)
+        key = (row.id, row.version, category_name)
+        fragment = risk_row_fragments.get(key)
+        if fragment is None:
+            if template is None:
+                template = templates.get_template("_risk_row.html")
+            fragment = Markup(template.render(risk={
+                "id": row.id,
+                "title": row.title,
+                "probability": row.probability,
+                "impact": row.impact,
+                "risk_level": row.risk_level.value if row.risk_level else None,
+                # Mismo texto que la API y las filas que agrega app.js (IN_PROGRESS)
+                "status": schemas.RiskStatus(row.status.value).value if row.status else None,
+                "owner": row.owner,
+                "category_name": category_name,
+            }))
+            risk_row_fragments.put(key, fragment)
+        fragments.append(fragment)
+    return Markup("").join(fragments)
@@ -0,0 +1,14 @@
+"""
+Suite de benchmarks de la API de gestión de riesgos.
+
+Siembra una base SQLite temporal, ejecuta la aplicación FastAPI real en el
+mismo proceso mediante un cliente ASGI y mide latencias (p50/p95/p99) y
+throughput por escenario y nivel de concurrencia. Los resultados se escriben
+en JSON para comparar ejecuciones.
+
+Uso (desde la raíz del proyecto):
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.run --risks 5000 --concurrency 1,8,32 --output base.json
+    python -m benchmarks.run --skip-scoring --serialization-rows 10000 --scenarios list
+    python -m benchmarks.compare base.json nuevo.json
+"""
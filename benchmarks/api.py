@@ -0,0 +1,102 @@
+"""
+Escenarios de carga contra la aplicación FastAPI en el mismo proceso.
+"""
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks.stats import summarize
+
+
+def _risk_payload(rng, category_ids):
+    return {
+        "title": "Riesgo creado en benchmark",
+        "description": "Riesgo creado durante la prueba de carga",
+        "probability": rng.randint(1, 5),
+        "impact": rng.randint(1, 5),
+        "owner": "benchmark",
+        "category_id": rng.choice(category_ids),
+    }
+
+
+async def _list_risks(client, rng, ctx):
+    skip = rng.randrange(0, max(len(ctx["risk_ids"]) - 50, 1))
+    return await client.get("/risks/", params={"skip": skip, "limit": 50})
+
+async def _risk_detail(client, rng, ctx):
+    return await client.get(f"/risks/{rng.choice(ctx['risk_ids'])}")
+
+async def _create_risk(client, rng, ctx):
+    return await client.post("/risks/", json=_risk_payload(rng, ctx["category_ids"]))
+
+async def _update_risk(client, rng, ctx):
+    return await client.put(
+        f"/risks/{rng.choice(ctx['risk_ids'])}",
+        json={"probability": rng.randint(1, 5), "impact": rng.randint(1, 5)}
+    )
+
+async def _recommendations(client, rng, ctx):
+    return await client.get(f"/risks/{rng.choice(ctx['risk_ids'])}/recommendations")
+
+async def _html_risks(client, rng, ctx):
+    return await client.get("/risks")
+
+async def _html_risk_detail(client, rng, ctx):
+    return await client.get(f"/risk/{rng.choice(ctx['risk_ids'])}")
+
+
+SCENARIOS = {
+    "list": _list_risks,
+    "detail": _risk_detail,
+    "create": _create_risk,
+    "update": _update_risk,
+    "recommendations": _recommendations,
+    "html_risks": _html_risks,
+    "html_risk_detail": _html_risk_detail,
+}
+
+
+async def run_scenario(client, scenario, ctx, requests: int, concurrency: int, seed: int) -> dict:
+    """
+    Ejecuta `requests` peticiones del escenario repartidas entre `concurrency`
+    trabajadores concurrentes y resume sus latencias
+    """
+    remaining = iter(range(requests))
+    latencies = []
+    errors = 0
+
+    async def worker(number):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + number)
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await scenario(client, rng, ctx)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, elapsed)
+    result["errors"] = errors
+    return result
+
+
+async def run_api_benchmarks(app, ctx, scenarios, concurrency_levels, requests: int,
+                             warmup: int = 10, seed: int = 42) -> dict:
+    """Ejecuta cada escenario en cada nivel de concurrencia con un cliente ASGI"""
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for name in scenarios:
+            scenario = SCENARIOS[name]
+            await run_scenario(client, scenario, ctx, warmup, 1, seed)
+            results[name] = {
+                str(concurrency): await run_scenario(client, scenario, ctx, requests, concurrency, seed)
+                for concurrency in concurrency_levels
+            }
+    return results
@@ -0,0 +1,55 @@
+"""
+Compara dos archivos de resultados de benchmarks.
+
+Uso: python -m benchmarks.compare base.json nuevo.json [--metric p95_ms]
+"""
+import argparse
+import json
+
+
+def _change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare", description=__doc__.splitlines()[1])
+    parser.add_argument("base")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", default="p95_ms", help="Métrica de latencia de la API a comparar")
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"{'escenario':<20} {'concurrencia':>12} {'base':>10} {'nuevo':>10} {'cambio':>9}")
+    for scenario, levels in base.get("api", {}).items():
+        for concurrency, before in levels.items():
+            after = candidate.get("api", {}).get(scenario, {}).get(concurrency)
+            if after is None:
+                continue
+            print(f"{scenario:<20} {concurrency:>12} {before[args.metric]:>10} {after[args.metric]:>10} "
+                  f"{_change(before[args.metric], after[args.metric]):>9}")
+
+    for name, before in base.get("scoring", {}).items():
+        after = candidate.get("scoring", {}).get(name)
+        if after is None:
+            continue
+        print(f"{name:<33} {before['best_ns_per_call']:>10} {after['best_ns_per_call']:>10} "
+              f"{_change(before['best_ns_per_call'], after['best_ns_per_call']):>9}")
+
+    serialization_before = base.get("serialization", {})
+    serialization_after = candidate.get("serialization", {})
+    for path in ("orm_response_model", "rows_fast_json"):
+        before, after = serialization_before.get(path), serialization_after.get(path)
+        if before is None or after is None:
+            continue
+        print(f"{path:<33} {before[args.metric]:>10} {after[args.metric]:>10} "
+              f"{_change(before[args.metric], after[args.metric]):>9}")
+
+
+if __name__ == "__main__":
+    main()
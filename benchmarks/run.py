@@ -0,0 +1,107 @@
+"""
+Ejecuta la suite de benchmarks y escribe los resultados en JSON.
+
+Uso: python -m benchmarks.run [--risks N] [--concurrency 1,8,32] [--output archivo.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _parse_levels(value):
+    return [int(level) for level in value.split(",") if level]
+
+
+def main(argv=None):
+    from benchmarks.api import SCENARIOS
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.splitlines()[1])
+    parser.add_argument("--risks", type=int, default=2000, help="Riesgos a sembrar")
+    parser.add_argument("--categories", type=int, default=10, help="Categorías a sembrar")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario y nivel de concurrencia")
+    parser.add_argument("--concurrency", type=_parse_levels, default=[1, 8, 32], help="Niveles separados por comas")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Escenarios separados por comas")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla de los datos y peticiones")
+    parser.add_argument("--skip-scoring", action="store_true", help="Omite los micro-benchmarks de puntuación")
+    parser.add_argument("--serialization-rows", type=int, default=10000,
+                        help="Filas de la lista del benchmark de serialización")
+    parser.add_argument("--skip-serialization", action="store_true", help="Omite el benchmark de serialización")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    args = parser.parse_args(argv)
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="risk-bench-") as workdir:
+        # La URL debe fijarse antes de importar app.database, que crea los engines
+        os.environ["RISK_DB_URL"] = f"sqlite:///{Path(workdir) / 'benchmark.db'}"
+        # Las plantillas y los estáticos se resuelven con rutas relativas
+        os.chdir(PROJECT_ROOT)
+
+        from app.database import SessionLocal, engine, read_engine, init_db
+        from app.main import app
+        from app import crud
+        from benchmarks.api import run_api_benchmarks
+        from benchmarks.scoring import run_scoring_benchmarks
+        from benchmarks.serialization import run_serialization_benchmarks
+        from benchmarks.seed import seed_database
+
+        init_db()
+        db = SessionLocal()
+        try:
+            crud.load_recommendation_templates(db)
+            started = time.perf_counter()
+            risk_ids, category_ids = seed_database(db, args.risks, args.categories, args.seed)
+            seed_seconds = time.perf_counter() - started
+            crud.load_category_cache(db)
+        finally:
+            db.close()
+
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "risks": args.risks,
+                "categories": args.categories,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "seed": args.seed,
+                "seed_seconds": round(seed_seconds, 3),
+            },
+            "api": asyncio.run(run_api_benchmarks(
+                app, {"risk_ids": risk_ids, "category_ids": category_ids},
+                scenarios, args.concurrency, args.requests, seed=args.seed
+            )),
+        }
+        if not args.skip_scoring:
+            results["scoring"] = run_scoring_benchmarks()
+        # Va al final porque agrega riesgos si faltan para llegar a las filas pedidas
+        if not args.skip_serialization:
+            results["serialization"] = run_serialization_benchmarks(args.serialization_rows)
+
+        engine.dispose()
+        read_engine.dispose()
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"✅ Resultados escritos en {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
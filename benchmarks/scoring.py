@@ -0,0 +1,42 @@
+"""
+Micro-benchmarks de las funciones de puntuación de app.crud.
+"""
+import itertools
+import timeit
+
+from app import crud
+
+PAIRS = list(itertools.product(range(crud.SCALE_MIN, crud.SCALE_MAX + 1), repeat=2))
+
+
+def _levels():
+    return [(crud.calculate_risk_level(p, i), p, i) for p, i in PAIRS]
+
+
+def _bench(statement, number: int, repeat: int, calls_per_run: int = len(PAIRS)) -> dict:
+    # Por defecto cada ejecución recorre las 25 combinaciones de probabilidad e impacto
+    timings = timeit.repeat(statement, number=number, repeat=repeat)
+    calls = number * calls_per_run
+    best = min(timings)
+    return {
+        "calls": calls,
+        "best_ns_per_call": round(best / calls * 1e9, 1),
+        "mean_ns_per_call": round(sum(timings) / len(timings) / calls * 1e9, 1),
+    }
+
+
+def run_scoring_benchmarks(number: int = 2000, repeat: int = 5) -> dict:
+    levels = _levels()
+    thresholds = crud.get_scoring_thresholds()
+    results = {
+        "calculate_risk_level": _bench(
+            lambda: [crud.calculate_risk_level(p, i) for p, i in PAIRS], number, repeat),
+        "get_risk_recommendations": _bench(
+            lambda: [crud.get_risk_recommendations(level, p, i) for level, p, i in levels], number, repeat),
+        "get_detailed_recommendations": _bench(
+            lambda: [crud.get_detailed_recommendations(level, p, i) for level, p, i in levels], number, repeat),
+        # La compilación de la tabla se mide por llamada, no por combinación
+        "compile_scoring_table": _bench(
+            lambda: crud.compile_scoring_table(thresholds), max(number // 100, 1), repeat, calls_per_run=1),
+    }
+    return results
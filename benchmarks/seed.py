@@ -0,0 +1,62 @@
+"""
+Siembra de datos reproducible para los benchmarks.
+"""
+import random
+
+from sqlalchemy import func
+
+from app import crud, models, schemas
+
+RISK_STATUSES = list(schemas.RiskStatus)
+# Riesgos por UPDATE al asignar los estados (límite de parámetros de SQLite)
+STATUS_BATCH_SIZE = 500
+
+
+def seed_database(db, risks: int, categories: int, seed: int = 42):
+    """
+    Crea `categories` categorías y `risks` riesgos con valores pseudoaleatorios
+    deterministas. Los riesgos se insertan con crud.bulk_create_risks, igual
+    que una importación masiva real; como las altas siempre quedan OPEN, el
+    estado sorteado se asigna después con crud.bulk_update_risks. Retorna
+    (ids de riesgos, ids de categorías).
+    """
+    rng = random.Random(seed)
+    category_ids = []
+    for number in range(categories):
+        category = crud.create_category(db, schemas.RiskCategoryCreate(
+            name=f"Categoría {number + 1}",
+            description=f"Categoría de benchmark {number + 1}"
+        ))
+        category_ids.append(category.id)
+
+    first_id = (db.query(func.max(models.Risk.id)).scalar() or 0) + 1
+    statuses = []
+
+    def records():
+        for number in range(risks):
+            record = {
+                "title": f"Riesgo de benchmark {number + 1}",
+                "description": f"Descripción del riesgo {number + 1} para pruebas de carga",
+                "probability": rng.randint(crud.SCALE_MIN, crud.SCALE_MAX),
+                "impact": rng.randint(crud.SCALE_MIN, crud.SCALE_MAX),
+                "owner": f"responsable{rng.randint(1, 20)}",
+                "category_id": rng.choice(category_ids),
+            }
+            # Se sortea en el mismo orden que antes para conservar los datos de la semilla
+            statuses.append(rng.choice(RISK_STATUSES))
+            yield number + 1, record
+
+    result = crud.bulk_create_risks(db, records(), batch_size=1000)
+    if result["failed"]:
+        raise RuntimeError(f"La siembra falló en {result['failed']} registros: {result['errors'][:3]}")
+
+    new_ids = [row.id for row in db.query(models.Risk.id).filter(models.Risk.id >= first_id).order_by(models.Risk.id)]
+    for status in RISK_STATUSES:
+        if status == schemas.RiskStatus.OPEN:
+            continue
+        ids = [risk_id for risk_id, drawn in zip(new_ids, statuses) if drawn == status]
+        for start in range(0, len(ids), STATUS_BATCH_SIZE):
+            crud.bulk_update_risks(db, schemas.RiskUpdate(status=status), ids=ids[start:start + STATUS_BATCH_SIZE])
+
+    risk_ids = [row.id for row in db.query(models.Risk.id).order_by(models.Risk.id)]
+    return risk_ids, category_ids
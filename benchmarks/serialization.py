@@ -0,0 +1,92 @@
+"""
+Benchmark de la serialización de GET /risks/ con listas grandes: la ruta
+anterior (objetos ORM validados con response_model y codificados con
+JSONResponse) contra crud.get_risk_rows + fast_json, con y sin gzip.
+"""
+import asyncio
+import gzip
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app import crud, fast_json, models, schemas
+from app.database import ReadSessionLocal, SessionLocal
+
+from .stats import summarize
+
+_RESPONSE_FIELD = create_response_field(name="Response_read_risks", type_=List[schemas.Risk])
+
+
+def _orm_path(db, rows: int) -> bytes:
+    # Lo mismo que hace FastAPI con response_model=List[schemas.Risk]
+    risks = crud.get_risks(db, limit=rows)
+    content = asyncio.run(serialize_response(field=_RESPONSE_FIELD, response_content=risks))
+    return JSONResponse(content).body
+
+
+def _fast_path(db, rows: int) -> bytes:
+    return fast_json.dumps(crud.get_risk_rows(db, limit=rows))
+
+
+def _top_up(rows: int):
+    """Agrega riesgos hasta que haya al menos `rows` en la base"""
+    db = SessionLocal()
+    try:
+        missing = rows - db.query(models.Risk).count()
+        category_id = db.query(models.RiskCategory.id).limit(1).scalar()
+        if missing > 0:
+            crud.bulk_create_risks(db, (
+                (number, {
+                    "title": f"Riesgo de serialización {number}",
+                    "description": "Relleno para el benchmark de serialización",
+                    "probability": number % 5 + 1,
+                    "impact": number // 5 % 5 + 1,
+                    "owner": "benchmark",
+                    "category_id": category_id,
+                })
+                for number in range(1, missing + 1)
+            ), batch_size=1000)
+    finally:
+        db.close()
+
+
+def _measure(path, rows: int, repeat: int):
+    latencies = []
+    body = b""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        db = ReadSessionLocal()
+        try:
+            call_started = time.perf_counter()
+            body = path(db, rows)
+            latencies.append(time.perf_counter() - call_started)
+        finally:
+            db.close()
+    return summarize(latencies, time.perf_counter() - started), body
+
+
+def run_serialization_benchmarks(rows: int = 10000, repeat: int = 10) -> dict:
+    _top_up(rows)
+    results = {"rows": rows, "json_encoder": "orjson" if fast_json.orjson is not None else "json"}
+
+    orm_stats, orm_body = _measure(_orm_path, rows, repeat)
+    fast_stats, fast_body = _measure(_fast_path, rows, repeat)
+    results["orm_response_model"] = {**orm_stats, "bytes": len(orm_body)}
+    results["rows_fast_json"] = {**fast_stats, "bytes": len(fast_body)}
+    # Ambas rutas deben producir el mismo documento
+    results["identical_output"] = orm_body == fast_body
+
+    started = time.perf_counter()
+    compressed = gzip.compress(fast_body, compresslevel=fast_json.GZIP_LEVEL)
+    results["gzip"] = {
+        "level": fast_json.GZIP_LEVEL,
+        "bytes": len(compressed),
+        "ratio": round(len(compressed) / len(fast_body), 3) if fast_body else 0.0,
+        "compress_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+    if fast_stats["p50_ms"]:
+        results["speedup_p50"] = round(orm_stats["p50_ms"] / fast_stats["p50_ms"], 2)
+    return results
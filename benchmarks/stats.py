@@ -0,0 +1,25 @@
+"""
+Estadísticas de latencia compartidas por los benchmarks.
+"""
+import math
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Percentil por el método nearest-rank sobre valores ya ordenados"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, elapsed: float) -> dict:
+    """Resume latencias en segundos como milisegundos y peticiones por segundo"""
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
@@ -1,13 +1,15 @@
 // Función para cargar estadísticas
 async function loadStats() {
     try {
-        const response = await fetch('/risks/');
-        const risks = await response.json();
+        // El resumen se calcula en el servidor con una sola consulta agrupada
+        const response = await fetch('/dashboard/');
+        const summary = await response.json();
+        const medium = summary.risks_by_level.find(l => l.level === 'MEDIUM');
         
-        document.getElementById('total-risks').textContent = risks.length;
-        document.getElementById('critical-risks').textContent = risks.filter(r => r.risk_level === 'CRITICAL').length;
-        document.getElementById('high-risks').textContent = risks.filter(r => r.risk_level === 'HIGH').length;
-        document.getElementById('medium-risks').textContent = risks.filter(r => r.risk_level === 'MEDIUM').length;
+        document.getElementById('total-risks').textContent = summary.total_risks;
+        document.getElementById('critical-risks').textContent = summary.critical_risks_count;
+        document.getElementById('high-risks').textContent = summary.high_risks_count;
+        document.getElementById('medium-risks').textContent = medium ? medium.count : 0;
     } catch (error) {
         console.error('Error loading stats:', error);
     }
@@ -61,7 +63,7 @@ async function deleteRisk(id) {
                 // Si estamos en la página de detalle, volver a la lista
                 if (window.location.pathname.includes('/risk/')) {
                     window.location.href = '/risks';
-                } else {
+                } else if (!removeRiskRow(id)) {
                     location.reload();
                 }
             } else {
@@ -74,6 +76,164 @@ async function deleteRisk(id) {
     }
 }
 
+// Filas de la lista de riesgos (misma estructura que templates/risks.html)
+function riskCell(text) {
+    const cell = document.createElement('td');
+    cell.textContent = text;
+    return cell;
+}
+
+function riskActionButton(className, icon, onClick) {
+    const button = document.createElement('button');
+    button.className = `btn btn-sm ${className}`;
+    button.innerHTML = `<i class="fas ${icon}"></i>`;
+    button.addEventListener('click', onClick);
+    return button;
+}
+
+function buildRiskRow(risk) {
+    const level = risk.risk_level || 'UNKNOWN';
+    const row = document.createElement('tr');
+    row.className = `risk-${level.toLowerCase()}`;
+    row.dataset.riskId = risk.id;
+
+    const title = document.createElement('strong');
+    title.textContent = risk.title;
+    row.appendChild(document.createElement('td')).appendChild(title);
+
+    const badge = document.createElement('span');
+    badge.className = `badge risk-badge ${level.toLowerCase()}`;
+    badge.textContent = level;
+    row.appendChild(document.createElement('td')).appendChild(badge);
+
+    row.appendChild(riskCell(`${risk.probability}/5`));
+    row.appendChild(riskCell(`${risk.impact}/5`));
+    row.appendChild(riskCell(risk.category_name || 'Sin categoría'));
+    row.appendChild(riskCell(risk.owner));
+    row.appendChild(riskCell(risk.status || 'UNKNOWN'));
+
+    const actions = document.createElement('td');
+    const view = document.createElement('a');
+    view.href = `/risk/${risk.id}`;
+    view.className = 'btn btn-sm btn-info me-1';
+    view.innerHTML = '<i class="fas fa-eye"></i>';
+    actions.appendChild(view);
+    actions.appendChild(riskActionButton('btn-warning me-1', 'fa-edit', () => editRisk(risk.id)));
+    actions.appendChild(riskActionButton('btn-danger', 'fa-trash', () => deleteRisk(risk.id)));
+    row.appendChild(actions);
+    return row;
+}
+
+function findRiskRow(id) {
+    return document.querySelector(`#risks-body tr[data-risk-id="${id}"]`);
+}
+
+function removeRiskRow(id) {
+    const row = findRiskRow(id);
+    if (!row) return false;
+    row.remove();
+    return true;
+}
+
+// Mismos criterios que schemas.RiskFilter en el servidor (owner es una
+// subcadena sin distinguir mayúsculas)
+function matchesRiskFilters(risk, filters) {
+    if (filters.category_id != null && risk.category_id !== filters.category_id) return false;
+    if (filters.risk_level && risk.risk_level !== filters.risk_level) return false;
+    if (filters.status && risk.status !== filters.status) return false;
+    if (filters.probability_min != null && !(risk.probability >= filters.probability_min)) return false;
+    if (filters.probability_max != null && !(risk.probability <= filters.probability_max)) return false;
+    if (filters.impact_min != null && !(risk.impact >= filters.impact_min)) return false;
+    if (filters.impact_max != null && !(risk.impact <= filters.impact_max)) return false;
+    if (filters.owner && !(risk.owner || '').toLowerCase().includes(filters.owner.toLowerCase())) return false;
+    return true;
+}
+
+// Actualizaciones en vivo de la lista de riesgos (Server-Sent Events)
+function setupRiskFeed() {
+    const source = new EventSource('/risks/events');
+    const riskBody = document.getElementById('risks-body');
+    // Filtros que aplicó el servidor a esta página
+    const filters = JSON.parse((riskBody && riskBody.dataset.filters) || '{}');
+
+    function applyRiskEvent(event) {
+        const data = JSON.parse(event.data);
+        const body = document.getElementById('risks-body');
+        // Lista vacía: la tabla no existe todavía, se recarga la página
+        if (!body) {
+            location.reload();
+            return;
+        }
+        const current = findRiskRow(data.id);
+        if (data.type === 'deleted') {
+            if (current) current.remove();
+            return;
+        }
+        const row = buildRiskRow(data.risk);
+        if (current && !matchesRiskFilters(data.risk, filters)) {
+            // Ya no cumple los filtros de la página (p. ej. se cerró con status=OPEN)
+            current.remove();
+        } else if (current) {
+            current.replaceWith(row);
+        } else if (data.type === 'created' && body.dataset.liveInsert === 'true') {
+            // Solo en la primera página ordenada por fecha descendente
+            body.prepend(row);
+        }
+    }
+
+    // Cambios masivos o eventos perdidos: se piden solo los cambios desde el
+    // token de la página; si aparecen riesgos que no están en la tabla o hay
+    // demasiados cambios, la página se vuelve a pedir completa
+    let catchingUp = null;
+    async function catchUp() {
+        const body = document.getElementById('risks-body');
+        if (!body || !body.dataset.changeToken) {
+            location.reload();
+            return;
+        }
+        try {
+            const params = new URLSearchParams({since: body.dataset.changeToken});
+            const response = await fetch(`/risks/changes?${params}`);
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const changes = await response.json();
+            const matching = changes.items.filter(risk => matchesRiskFilters(risk, filters));
+            if (changes.has_more || matching.some(risk => !findRiskRow(risk.id))) {
+                location.reload();
+                return;
+            }
+            changes.deleted.forEach(removeRiskRow);
+            changes.items.filter(risk => !matching.includes(risk)).forEach(risk => removeRiskRow(risk.id));
+            matching.forEach(risk => findRiskRow(risk.id).replaceWith(buildRiskRow(risk)));
+            body.dataset.changeToken = changes.next_token;
+        } catch (error) {
+            console.error('Error syncing risks:', error);
+            location.reload();
+        }
+    }
+
+    function scheduleCatchUp() {
+        // Los eventos que llegan durante una sincronización se cubren con la siguiente
+        catchingUp = (catchingUp || Promise.resolve()).then(catchUp);
+    }
+
+    // EventSource reconecta solo, pero los cambios mientras estuvo caída no
+    // se reenvían: al reabrir tras un error se piden desde el token de la página
+    let disconnected = false;
+    source.addEventListener('error', () => { disconnected = true; });
+    source.addEventListener('open', () => {
+        if (disconnected) {
+            disconnected = false;
+            scheduleCatchUp();
+        }
+    });
+
+    source.addEventListener('created', applyRiskEvent);
+    source.addEventListener('updated', applyRiskEvent);
+    source.addEventListener('deleted', applyRiskEvent);
+    source.addEventListener('bulk', scheduleCatchUp);
+    source.addEventListener('resync', scheduleCatchUp);
+}
+
 // Preview del riesgo en tiempo real
 function setupRiskPreview() {
     const form = document.querySelector('form');
@@ -133,4 +293,8 @@ document.addEventListener('DOMContentLoaded', function() {
     if (document.getElementById('risk-preview')) {
         setupRiskPreview();
     }
+
+    if (window.location.pathname === '/risks' && window.EventSource) {
+        setupRiskFeed();
+    }
 });
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Configuración común de las pruebas: una base SQLite temporal por sesión.
+
+RISK_DB_URL se fija antes de importar app.database, que crea los engines
+al importarse.
+"""
+import os
+import tempfile
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="risk-tests-")
+os.environ["RISK_DB_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'risk_management.db')}"
+
+# app.database primero: importa los modelos y evita la importación circular
+from app.database import SessionLocal, init_db  # noqa: E402
+from app import crud, schemas  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_db()
+    db = SessionLocal()
+    try:
+        crud.load_recommendation_templates(db)
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def category(db):
+    return crud.create_category(db, schemas.RiskCategoryCreate(
+        name=f"Categoría de prueba {os.urandom(4).hex()}", description="Pruebas"
+    ))
+
+
+@pytest.fixture
+def make_risk(db, category):
+    def make(**values):
+        data = {
+            "title": "Riesgo de prueba",
+            "description": "Descripción",
+            "probability": 2,
+            "impact": 3,
+            "owner": "pruebas",
+            "category_id": category.id,
+        }
+        data.update(values)
+        return crud.create_risk(db, schemas.RiskCreate(**data))
+    return make
+
+
+@pytest.fixture
+def client(database):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
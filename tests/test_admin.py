@@ -0,0 +1,12 @@
+from app.routers import admin
+
+
+def test_admin_routes_are_disabled_without_opt_in(client, monkeypatch):
+    monkeypatch.setattr(admin, "ENABLED", False)
+    assert client.post("/admin/rescore").status_code == 404
+    assert client.get("/admin/rescore").status_code == 404
+
+
+def test_admin_routes_with_opt_in(client, monkeypatch):
+    monkeypatch.setattr(admin, "ENABLED", True)
+    assert client.get("/admin/rescore").status_code == 200
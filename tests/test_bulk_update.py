@@ -0,0 +1,14 @@
+def test_out_of_scale_patch_matches_put(client, make_risk, db):
+    patched = make_risk(probability=1, impact=1)
+    put = make_risk(probability=1, impact=1)
+    db.close()
+
+    response = client.patch("/risks", json={"ids": [patched.id], "changes": {"probability": 7}})
+    assert response.status_code == 200
+    client.put(f"/risks/{put.id}", json={"probability": 7})
+
+    after_patch = client.get(f"/risks/{patched.id}").json()
+    after_put = client.get(f"/risks/{put.id}").json()
+    assert after_patch["risk_level"] == after_put["risk_level"]
+    assert after_patch["recommendation_template_id"] is None
+    assert after_patch["recommendations"] == after_put["recommendations"]
@@ -0,0 +1,29 @@
+from app import crud
+from app.database import SessionLocal
+
+
+def _risks_version():
+    db = SessionLocal()
+    try:
+        return crud.get_collection_version(db, crud.RISKS_COLLECTION)
+    finally:
+        db.close()
+
+
+def test_put_without_changes_keeps_versions(client, make_risk, db):
+    risk = make_risk(title="Sin cambios", probability=2, impact=3)
+    db.close()
+    collection_version = _risks_version()
+    etag = client.get(f"/risks/{risk.id}").headers["etag"]
+
+    for body in ({}, {"title": "Sin cambios", "probability": 2, "status": "OPEN"}):
+        response = client.put(f"/risks/{risk.id}", json=body, headers={"If-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] == etag
+
+    assert _risks_version() == collection_version
+    changed = client.put(f"/risks/{risk.id}", json={"title": "Con cambios"}, headers={"If-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert client.put(f"/risks/{risk.id}", json={}, headers={"If-Match": etag}).status_code == 409
+    assert client.put("/risks/999999", json={}).status_code == 404
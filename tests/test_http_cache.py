@@ -0,0 +1,12 @@
+def test_summary_etag_changes_when_category_is_renamed(client, category, make_risk, db):
+    make_risk()
+    db.close()  # Un solo escritor: se libera antes de las peticiones
+    first = client.get("/risks/summary")
+    etag = first.headers["etag"]
+
+    client.put(f"/categories/{category.id}", json={"name": f"{category.name} renombrada", "description": ""})
+
+    second = client.get("/risks/summary", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+    assert any(item["category_name"] == f"{category.name} renombrada" for item in second.json())
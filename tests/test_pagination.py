@@ -0,0 +1,22 @@
+from sqlalchemy import text
+
+from app.database import engine, init_db
+
+
+def test_cursor_pages_reach_risks_without_created_at(client, make_risk, db):
+    legacy = make_risk(title="Riesgo sin fecha")
+    make_risk()
+    db.close()
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE risks SET created_at = NULL WHERE id = :id"), {"id": legacy.id})
+
+    init_db()
+    with engine.connect() as connection:
+        expected = connection.execute(text("SELECT id FROM risks ORDER BY id")).scalars().all()
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        page = client.get("/risks/", params={"cursor": cursor, "limit": 1}).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+    assert sorted(seen) == expected
@@ -0,0 +1,9 @@
+from app import crud
+
+
+def test_dedupe_runs_once_per_database(db):
+    # El inicio de la aplicación (u otra prueba) pudo haberla ejecutado ya
+    crud.dedupe_recommendations_once(db)
+
+    assert crud.get_collection_version(db, crud.RECOMMENDATIONS_DEDUPE_MARKER) == 1
+    assert crud.dedupe_recommendations_once(db) is None
@@ -0,0 +1,12 @@
+from app import crud
+
+
+def test_rescore_keeps_custom_recommendations(db, make_risk):
+    risk = make_risk()
+    crud.update_risk_recommendations(db, risk.id, "MY CUSTOM TEXT")
+
+    crud.rescore_risks(db, restart=True)
+
+    rescored = crud.get_risk(db, risk.id)
+    assert rescored.custom_recommendations == "MY CUSTOM TEXT"
+    assert rescored.recommendations == "MY CUSTOM TEXT"
@@ -0,0 +1,9 @@
+def test_rendered_rows_use_api_status_text(client, make_risk, db):
+    risk = make_risk()
+    db.close()
+    client.put(f"/risks/{risk.id}", json={"status": "IN_PROGRESS"})
+
+    page = client.get("/risks?status=IN_PROGRESS")
+    assert page.status_code == 200
+    assert "IN_PROGRESS" in page.text
+    assert "IN-PROGRESS" not in page.text